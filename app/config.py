@@ -6,6 +6,42 @@ class Settings(BaseSettings):
     DATABASE_URL: str = Field(default="sqlite+aiosqlite:///./local.db")
     APP_TITLE: str = "Etykiety API"
     DEFAULT_SHEET: str = "A4"
+    # co ile sekund sprawdzać licznik wersji typów/arkuszy w bazie
+    REGISTRY_REFRESH_S: float = 5.0
+
+    # Rola procesu: "all" – renderuje sam; "api" – tylko kolejkuje zlecenia dla `python -m app.worker`
+    APP_ROLE: str = "all"
+    JOB_QUEUE: str = "db"  # "db" (tabela render_jobs) albo "fs" (katalog JOB_QUEUE_DIR)
+    JOB_QUEUE_DIR: str = "./jobs"
+    JOB_WAIT_TIMEOUT_S: float = 60.0  # potem API odpowiada 202 i /jobs/{id}
+    # przy APP_ROLE=api: limit zleceń w toku na pod API (zamiast RENDER_CONCURRENCY) –
+    # przepustowość wyznaczają workery, nie liczba CPU poda API
+    JOB_MAX_INFLIGHT: int = 64
+    JOB_LEASE_S: float = 120.0
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETENTION_S: float = 3600.0
+    WORKER_POLL_S: float = 0.2
+
+    # Admission control dla endpointów renderujących
+    ADMISSION_ENABLED: bool = True
+    RENDER_CONCURRENCY: int = 0  # 0 = CPU dostępne dla procesu (limit cgroup/affinity)
+    # sloty, których zlecenia masowe nie mogą zająć – zawsze wolne dla single/preview
+    ADMISSION_INTERACTIVE_RESERVED: int = 1
+    # ?preview=1 trafia do klasy interaktywnej tylko do tego kosztu, większe zostają masowe
+    ADMISSION_PREVIEW_MAX_COST: float = 50.0
+    ADMISSION_WEIGHT_INTERACTIVE: int = 4
+    ADMISSION_WEIGHT_BULK: int = 1
+    ADMISSION_CLIENT_CONCURRENCY: int = 4
+    # klient = adres IP; nagłówek X-Client-Id tylko za zaufanym proxy/uwierzytelnianiem
+    ADMISSION_TRUST_CLIENT_ID: bool = False
+    ADMISSION_CLIENT_COST_BUDGET: float = 2000.0
+    ADMISSION_MAX_QUEUE_COST: float = 10000.0
+    ADMISSION_MAX_QUEUE_WAIT_S: float = 30.0
+
+    # Profilowanie (?profile=1 i /debug/profiles) – wyłączone, dopóki DEBUG_TOKEN jest pusty
+    DEBUG_TOKEN: str = ""
+    PROFILE_DIR: str = "./profiles"
+    PROFILE_KEEP: int = 50
 
     class Config:
         env_file = ".env"
@@ -2,7 +2,8 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import models
-from app.schemas import StorageCreate, StorageLabelCreate
+from app.schemas import (SheetDef, StorageCreate, StorageLabelCreate,
+                         TypeDef)
 
 
 async def create_storage_db(session: AsyncSession, data: StorageCreate) -> models.Storage:
@@ -49,3 +50,55 @@ async def mark_printed_db(session: AsyncSession, storage_id: int, label_id: int,
     await session.commit()
     await session.refresh(label)
     return label
+
+
+# ---- Typy i arkusze ----
+
+async def _next_registry_version(session: AsyncSession) -> int:
+    # wiersz tworzy init_db, więc FOR UPDATE zawsze ma co zablokować
+    rv = await session.get(models.RegistryVersion, 1, with_for_update=True)
+    rv.version += 1
+    return rv.version
+
+async def _upsert_def(session: AsyncSession, model, data, create: bool):
+    row = await session.get(model, data.key)
+    if create and row and not row.deleted:
+        raise ValueError("already_exists")
+    if not create and (not row or row.deleted):
+        raise ValueError("not_found")
+    if not row:
+        row = model(key=data.key)
+        session.add(row)
+    for field, value in data.model_dump().items():
+        setattr(row, field, value)
+    row.deleted = False
+    row.version = await _next_registry_version(session)
+    await session.commit()
+    await session.refresh(row)
+    return row
+
+async def _delete_def(session: AsyncSession, model, key: str):
+    row = await session.get(model, key)
+    if not row or row.deleted:
+        raise ValueError("not_found")
+    row.deleted = True
+    row.version = await _next_registry_version(session)
+    await session.commit()
+
+async def create_template_db(session: AsyncSession, data: TypeDef) -> models.LabelTemplate:
+    return await _upsert_def(session, models.LabelTemplate, data, create=True)
+
+async def update_template_db(session: AsyncSession, data: TypeDef) -> models.LabelTemplate:
+    return await _upsert_def(session, models.LabelTemplate, data, create=False)
+
+async def delete_template_db(session: AsyncSession, key: str):
+    await _delete_def(session, models.LabelTemplate, key)
+
+async def create_sheet_db(session: AsyncSession, data: SheetDef) -> models.LabelSheet:
+    return await _upsert_def(session, models.LabelSheet, data, create=True)
+
+async def update_sheet_db(session: AsyncSession, data: SheetDef) -> models.LabelSheet:
+    return await _upsert_def(session, models.LabelSheet, data, create=False)
+
+async def delete_sheet_db(session: AsyncSession, key: str):
+    await _delete_def(session, models.LabelSheet, key)
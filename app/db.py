@@ -1,6 +1,8 @@
 from typing import Annotated
 
 from fastapi import Depends
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import (AsyncSession, async_sessionmaker,
                                     create_async_engine)
 from sqlalchemy.orm import declarative_base
@@ -20,6 +22,14 @@ async def init_db():
     from app import models  # ensure models are imported
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    # wiersz licznika wersji rejestru musi istnieć, zanim zapis zablokuje go FOR UPDATE
+    try:
+        async with engine.begin() as conn:
+            exists = await conn.scalar(select(models.RegistryVersion.id).where(models.RegistryVersion.id == 1))
+            if exists is None:
+                await conn.execute(insert(models.RegistryVersion).values(id=1, version=0))
+    except IntegrityError:
+        pass  # równoległy start innego procesu zdążył go utworzyć
 
 async def get_session() -> AsyncSession:
     async with SessionLocal() as session:
@@ -1,22 +1,36 @@
+import asyncio
 from typing import List, Optional
 
-from fastapi import FastAPI, HTTPException, Query, Response
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 
-from app.db import SessionDep, init_db
-from app.render.layout import export_svg_pages, layout_labels_to_pages
-from app.render.svg_renderer import render_label_svg
+from app.config import settings
+from app.db import SessionDep, SessionLocal, init_db
+from app.render.compression import encode_body, negotiate_encoding
+from app.render.pipeline import batch_job, run_render_job, single_job
 from app.schemas import (LabelBatchRequest, LabelSingleRequest,
-                         PrintMissingResponse, SheetListResponse,
+                         PrintMissingResponse, SheetDef, SheetListResponse,
                          StorageCreate, StorageLabelCreate, StorageLabelOut,
-                         StorageOut, TypeListResponse)
+                         StorageOut, TypeDef, TypeListResponse)
+from app.services.admission import (BULK, INTERACTIVE, admission,
+                                    batch_priority, estimate_cost, pages_for,
+                                    render_slot)
 from app.services.icons import IconResolver
-from app.services.sheets import SHEETS, get_sheet_by_key
+from app.services.jobs import (FAILED, QUEUED, RUNNING, JobResult,
+                               get_job_queue, wait_for_job)
+from app.services.profiling import (list_profiles, profile_path, profile_text,
+                                    require_debug, run_profiled, save_profile)
+from app.services.registry import refresh_loop, registry
+from app.services.sheets import (create_sheet, delete_sheet, get_sheet_by_key,
+                                 list_sheets, update_sheet)
 from app.services.storage import (add_label_to_storage, create_storage,
                                   list_storage_labels, list_storages,
                                   mark_printed, print_missing_labels)
-from app.services.templates import TEMPLATES, get_template_by_key
+from app.services.templates import (create_template, delete_template,
+                                    get_template_by_key, list_templates,
+                                    update_template)
 
 app = FastAPI(title="Labelo API", version="0.1.0")
 
@@ -36,6 +50,9 @@ icon_resolver = IconResolver(base_dir="assets/tabler-icons")
 @app.on_event("startup")
 async def on_startup():
     await init_db()
+    async with SessionLocal() as session:
+        await registry.refresh(session)
+    app.state.registry_refresher = asyncio.create_task(refresh_loop(SessionLocal, settings.REGISTRY_REFRESH_S))
 
 
 @app.get("/health")
@@ -46,22 +63,141 @@ async def health():
 # ---- Meta: types & sheets -----------------------------------------------------
 
 @app.get("/types", response_model=TypeListResponse)
-async def list_types():
-    return {"types": list(TEMPLATES.values())}
+async def api_list_types():
+    return {"types": list_templates()}
+
+
+@app.post("/types", response_model=TypeDef, status_code=201)
+async def api_create_type(data: TypeDef, session: SessionDep):
+    """Add a custom label type (a key equal to a built-in one overrides it)."""
+    return await create_template(session, data)
+
+
+@app.put("/types/{key}", response_model=TypeDef)
+async def api_update_type(key: str, data: TypeDef, session: SessionDep):
+    return await update_template(session, key, data)
+
+
+@app.delete("/types/{key}", status_code=204)
+async def api_delete_type(key: str, session: SessionDep):
+    """Delete a custom type; an overridden built-in becomes visible again."""
+    await delete_template(session, key)
 
 
 @app.get("/sheets", response_model=SheetListResponse)
-async def list_sheets():
-    return {"sheets": list(SHEETS.values())}
+async def api_list_sheets():
+    return {"sheets": list_sheets()}
+
+
+@app.post("/sheets", response_model=SheetDef, status_code=201)
+async def api_create_sheet(data: SheetDef, session: SessionDep):
+    """Add a custom sheet (a key equal to a built-in one overrides it)."""
+    return await create_sheet(session, data)
+
+
+@app.put("/sheets/{key}", response_model=SheetDef)
+async def api_update_sheet(key: str, data: SheetDef, session: SessionDep):
+    return await update_sheet(session, key, data)
+
+
+@app.delete("/sheets/{key}", status_code=204)
+async def api_delete_sheet(key: str, session: SessionDep):
+    """Delete a custom sheet; an overridden built-in becomes visible again."""
+    await delete_sheet(session, key)
 
 
 # ---- Rendering: batch & single -----------------------------------------------
 
+def _render_response(
+    exported,
+    warnings: list[str],
+    queue_wait_s: Optional[float] = None,
+    svg_encoding: Optional[tuple[str, int]] = None,
+) -> Response:
+    if exported is None:
+        return JSONResponse({"message": "No renderable labels", "warnings": warnings})
+    content, media_type, filename = exported
+    headers = {"Content-Disposition": f"inline; filename={filename}"}
+    if media_type == "image/svg+xml":
+        headers["Vary"] = "Accept-Encoding"
+        if svg_encoding:
+            content = encode_body(content, *svg_encoding)
+            headers["Content-Encoding"] = svg_encoding[0]
+    if warnings:
+        headers["X-Warnings"] = "; ".join(warnings)[:2000]
+    if queue_wait_s is not None:
+        headers["X-Queue-Time-Ms"] = f"{queue_wait_s * 1000:.1f}"
+    return Response(content=content, media_type=media_type, headers=headers)
+
+
+def _job_response(
+    result: JobResult,
+    warnings: Optional[list[str]] = None,
+    svg_encoding: Optional[tuple[str, int]] = None,
+) -> Response:
+    if result.status == FAILED:
+        raise HTTPException(status_code=500, detail=f"Render failed: {result.error}")
+    exported = (result.content, result.media_type, result.filename) if result.content is not None else None
+    return _render_response(exported, (warnings or []) + result.warnings, svg_encoding=svg_encoding)
+
+
+def _svg_encoding(request: Request, options: dict) -> Optional[tuple[str, int]]:
+    """Content-Encoding for an SVG response from ``Accept-Encoding`` and the job's svg options."""
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""), options.get("svg_encoding", "auto"))
+    return (encoding, options.get("svg_level", 6)) if encoding else None
+
+
+async def _run_render(
+    request: Request,
+    priority: str,
+    cost: float,
+    job: dict,
+    warnings: list[str],
+    profile: bool = False,
+) -> Response:
+    """Render in-process (APP_ROLE=all) or hand the job to a render worker (APP_ROLE=api).
+
+    With ``profile`` the in-process render runs under cProfile; stage times go
+    to ``Server-Timing`` and the dump to ``/debug/profiles/{X-Profile-Id}``.
+    """
+    if profile:
+        require_debug(request)
+        if settings.APP_ROLE == "api":
+            raise HTTPException(status_code=400, detail="Profiling requires in-process rendering (APP_ROLE=all)")
+    job["priority"] = priority  # kolejność pobierania przez workery (APP_ROLE=api)
+    svg_encoding = _svg_encoding(request, job["options"])
+    async with render_slot(request, priority, cost) as waited:
+        if settings.APP_ROLE == "api":
+            job_id = await get_job_queue().enqueue(job)
+            result = await wait_for_job(job_id, settings.JOB_WAIT_TIMEOUT_S)
+            if result is None:
+                return JSONResponse({"job_id": job_id, "status": "pending"}, status_code=202,
+                                    headers={"Location": f"/jobs/{job_id}"})
+            response = _job_response(result, warnings, svg_encoding)
+            response.headers["X-Queue-Time-Ms"] = f"{waited * 1000:.1f}"
+            return response
+        if not profile:
+            exported, render_warnings = await run_in_threadpool(run_render_job, job, icon_resolver)
+        else:
+            (exported, render_warnings), prof, pr = await run_in_threadpool(
+                run_profiled, run_render_job, job, icon_resolver)
+            prof.stages["queue"] = waited
+            profile_id = await run_in_threadpool(save_profile, prof, pr, request.url.path)
+
+    response = _render_response(exported, warnings + render_warnings, waited, svg_encoding)
+    if profile:
+        response.headers["Server-Timing"] = prof.server_timing()
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
 @app.post("/labels/batch")
 async def generate_labels_batch(
     payload: LabelBatchRequest,
-    fmt: str = Query("pdf", pattern="^(pdf|png|zip)$"),
+    request: Request,
+    fmt: str = Query("pdf", pattern="^(pdf|png|zip|svg)$"),
     preview: bool = Query(False),
+    profile: bool = Query(False),
 ):
     """Generate a batch of labels and lay them out onto a sheet."""
     tpl = get_template_by_key(payload.type)
@@ -76,75 +212,70 @@ async def generate_labels_batch(
     if len(payload.items) > 100:
         raise HTTPException(status_code=413, detail="Max 100 items per request")
 
-    warnings: list[str] = []
-
-    # Render per-label SVGs
-    label_svgs: list[tuple[str, float, float]] = []
-    for item in payload.items:
-        svg, w_mm, h_mm, item_warn = render_label_svg(
-            item=item,
-            template=tpl,
-            icon_resolver=icon_resolver,
-            colors=payload.options.colors_dict(),
-            padding_mm=payload.options.padding_mm or 3.0,
-            outline_icons=True,
-        )
-        if item_warn:
-            warnings.extend(item_warn)
-        label_svgs.append((svg, w_mm, h_mm))
-
-    # Layout onto pages
-    pages = layout_labels_to_pages(
-        label_svgs=label_svgs,
-        sheet=sheet,
-        with_cut_marks=payload.options.with_cut_marks or False,
-    )
-
-    # Export
-    content, media_type, filename = export_svg_pages(
-        pages=pages,
-        fmt=fmt,
-        dpi=payload.options.dpi or 300,
-        pdf_title="labels",
-    )
-
-    headers = {"Content-Disposition": f"inline; filename={filename}"}
-    if warnings:
-        headers["X-Warnings"] = "; ".join(warnings)[:2000]
-
-    return Response(content=content, media_type=media_type, headers=headers)
+    dpi = payload.options.dpi or 300
+    cost = estimate_cost(len(payload.items), pages_for(len(payload.items), sheet.cols * sheet.rows), dpi, fmt)
+    priority = batch_priority(preview or bool(payload.options.preview), cost)
+    job = batch_job(payload.items, payload.type, sheet, payload.options, fmt, pdf_title="labels")
+    return await _run_render(request, priority, cost, job, [], profile)
 
 
 @app.post("/labels/single")
 async def generate_label_single(
     payload: LabelSingleRequest,
-    fmt: str = Query("pdf", pattern="^(pdf|png)$"),
+    request: Request,
+    fmt: str = Query("pdf", pattern="^(pdf|png|svg)$"),
+    profile: bool = Query(False),
 ):
-    """Generate a single label as PDF/PNG (vector PDF; PNG at given DPI)."""
+    """Generate a single label as PDF/PNG/SVG (vector PDF; PNG at given DPI)."""
     tpl = get_template_by_key(payload.type)
     if not tpl:
         raise HTTPException(status_code=400, detail=f"Unknown type: {payload.type}")
 
-    svg, w_mm, h_mm, warnings = render_label_svg(
-        item=payload.item,
-        template=tpl,
-        icon_resolver=icon_resolver,
-        colors=payload.options.colors_dict(),
-        padding_mm=payload.options.padding_mm or 3.0,
-        outline_icons=True,
-    )
-
-    content, media_type, filename = export_svg_pages(
-        pages=[{"svg": svg, "width_mm": w_mm, "height_mm": h_mm}],
-        fmt=fmt,
-        dpi=payload.options.dpi or 300,
-        pdf_title="label",
-    )
+    cost = estimate_cost(1, 1, payload.options.dpi or 300, fmt)
+    job = single_job(payload.item, tpl, payload.options, fmt)
+    return await _run_render(request, INTERACTIVE, cost, job, [], profile)
 
-    headers = {"Content-Disposition": f"inline; filename={filename}"}
-    if warnings:
-        headers["X-Warnings"] = "; ".join(warnings)[:2000]
-    return Response(content=content, media_type=media_type, headers=headers)
+
+@app.get("/jobs/{job_id}")
+async def get_render_job(job_id: str, request: Request):
+    """Result of a render job that outlived JOB_WAIT_TIMEOUT_S (202 while still pending)."""
+    result = await get_job_queue().result(job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if result.status in (QUEUED, RUNNING):
+        return JSONResponse({"job_id": job_id, "status": result.status}, status_code=202)
+    return _job_response(result, svg_encoding=_svg_encoding(request, result.options))
+
+
+@app.get("/metrics/admission")
+async def admission_metrics():
+    """Queue depth, rejections and queue-time stats per priority class."""
+    if admission is None:
+        return {"enabled": False}
+    return {"enabled": True, **admission.metrics()}
+
+
+# ---- Debug: render profiles ---------------------------------------------------
+
+@app.get("/debug/profiles", dependencies=[Depends(require_debug)])
+async def debug_list_profiles():
+    """Saved ``?profile=1`` runs, newest first, with per-stage times."""
+    return {"profiles": await run_in_threadpool(list_profiles)}
+
+
+@app.get("/debug/profiles/{profile_id}", dependencies=[Depends(require_debug)])
+async def debug_get_profile(
+    profile_id: str,
+    format: str = Query("text", pattern="^(text|pstats)$"),
+    sort: str = Query("cumulative", pattern="^(cumulative|tottime|ncalls)$"),
+):
+    """cProfile dump: text summary, or raw pstats (e.g. for snakeviz)."""
+    path = profile_path(profile_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "pstats":
+        return FileResponse(path, media_type="application/octet-stream", filename=path.name)
+    return PlainTextResponse(await run_in_threadpool(profile_text, path, sort))
 
 
 # ---- Storage (pantry/workshop) ------------------------------------------------
@@ -196,7 +327,9 @@ async def api_mark_printed(
 async def api_print_missing(
     storage_id: int,
     session: SessionDep,
-    fmt: str = Query("pdf", pattern="^(pdf|png|zip)$"),
+    request: Request,
+    fmt: str = Query("pdf", pattern="^(pdf|png|zip|svg)$"),
+    profile: bool = Query(False),
 ):
     """
     Collect labels with missing quantities for a storage and render a batch.
@@ -211,46 +344,9 @@ async def api_print_missing(
     if not sheet:
         raise HTTPException(status_code=400, detail=f"Unknown sheet: {payload.options.sheet}")
 
-    label_svgs: list[tuple[str, float, float]] = []
-    all_warnings: list[str] = warnings or []
-
-    for item in payload.items:
-        # Allow per-item template override via meta.type
-        tpl_key = (item.get("meta") or {}).get("type", payload.type)
-        tpl = get_template_by_key(tpl_key)
-        if not tpl:
-            all_warnings.append(f"unknown_type:{tpl_key}")
-            continue
-
-        svg, w_mm, h_mm, w = render_label_svg(
-            item=item,  # dict compatible with LabelItem used inside renderer
-            template=tpl,
-            icon_resolver=icon_resolver,
-            colors=payload.options.colors_dict(),
-            padding_mm=payload.options.padding_mm or 3.0,
-            outline_icons=True,
-        )
-        if w:
-            all_warnings.extend(w)
-        label_svgs.append((svg, w_mm, h_mm))
-
-    if not label_svgs:
-        return JSONResponse({"message": "No renderable labels", "warnings": all_warnings})
-
-    pages = layout_labels_to_pages(
-        label_svgs=label_svgs,
-        sheet=sheet,
-        with_cut_marks=payload.options.with_cut_marks or False,
-    )
-
-    content, media_type, filename = export_svg_pages(
-        pages=pages,
-        fmt=fmt,
-        dpi=payload.options.dpi or 300,
-        pdf_title=f"storage-{storage_id}-missing",
-    )
-
-    headers = {"Content-Disposition": f"inline; filename={filename}"}
-    if all_warnings:
-        headers["X-Warnings"] = "; ".join(all_warnings)[:2000]
-    return Response(content=content, media_type=media_type, headers=headers)
+    n = len(payload.items)
+    cost = estimate_cost(n, pages_for(n, sheet.cols * sheet.rows), payload.options.dpi or 300, fmt)
+    # Allow per-item template override via meta.type
+    job = batch_job(payload.items, payload.type, sheet, payload.options, fmt,
+                    pdf_title=f"storage-{storage_id}-missing", per_item_type=True)
+    return await _run_render(request, BULK, cost, job, warnings or [], profile)
@@ -1,4 +1,7 @@
-from sqlalchemy import JSON, Boolean, ForeignKey, Integer, String, Text
+from datetime import datetime
+
+from sqlalchemy import (JSON, Boolean, Float, ForeignKey, Integer,
+                        LargeBinary, String, Text)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 from sqlalchemy.types import DateTime
@@ -11,8 +14,8 @@ class Storage(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(120), unique=True, nullable=False)
     description: Mapped[str | None] = mapped_column(Text)
-    created_at: Mapped = mapped_column(DateTime(timezone=True), server_default=func.now())
-    labels: Mapped[list[StorageLabel]] = relationship("StorageLabel", back_populates="storage", cascade="all, delete-orphan")
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    labels: Mapped[list["StorageLabel"]] = relationship("StorageLabel", back_populates="storage", cascade="all, delete-orphan")
 
 class StorageLabel(Base):
     __tablename__ = "storage_labels"
@@ -29,7 +32,7 @@ class StorageLabel(Base):
     desired_qty: Mapped[int] = mapped_column(Integer, default=0)
     printed_qty: Mapped[int] = mapped_column(Integer, default=0)
     active: Mapped[bool] = mapped_column(Boolean, default=True)
-    created_at: Mapped = mapped_column(DateTime(timezone=True), server_default=func.now())
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     storage: Mapped[Storage] = relationship("Storage", back_populates="labels")
 
@@ -38,3 +41,61 @@ class StorageLabel(Base):
         d = self.desired_qty or 0
         p = self.printed_qty or 0
         return max(d - p, 0)
+
+
+# ---- Definicje typów i arkuszy (nadpisują/uzupełniają wbudowane) ----
+# Każdy zapis podbija globalny licznik w RegistryVersion i zapisuje go w wierszu,
+# dzięki czemu rejestr w pamięci doczytuje tylko zmiany (version > ostatnio widziana).
+# Usunięcie to soft delete (deleted=True), żeby dotarło do innych podów.
+
+class RegistryVersion(Base):
+    __tablename__ = "registry_versions"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+class LabelTemplate(Base):
+    __tablename__ = "label_templates"
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    name: Mapped[str] = mapped_column(String(200), nullable=False)
+    width_mm: Mapped[float] = mapped_column(Float, nullable=False)
+    height_mm: Mapped[float] = mapped_column(Float, nullable=False)
+    shape: Mapped[str] = mapped_column(String(16), nullable=False)
+    version: Mapped[int] = mapped_column(Integer, index=True, nullable=False)
+    deleted: Mapped[bool] = mapped_column(Boolean, default=False)
+
+class LabelSheet(Base):
+    __tablename__ = "label_sheets"
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    name: Mapped[str] = mapped_column(String(200), nullable=False)
+    page_width_mm: Mapped[float] = mapped_column(Float, nullable=False)
+    page_height_mm: Mapped[float] = mapped_column(Float, nullable=False)
+    cols: Mapped[int] = mapped_column(Integer, nullable=False)
+    rows: Mapped[int] = mapped_column(Integer, nullable=False)
+    label_width_mm: Mapped[float] = mapped_column(Float, nullable=False)
+    label_height_mm: Mapped[float] = mapped_column(Float, nullable=False)
+    margin_top_mm: Mapped[float] = mapped_column(Float, nullable=False)
+    margin_left_mm: Mapped[float] = mapped_column(Float, nullable=False)
+    gutter_x_mm: Mapped[float] = mapped_column(Float, nullable=False)
+    gutter_y_mm: Mapped[float] = mapped_column(Float, nullable=False)
+    version: Mapped[int] = mapped_column(Integer, index=True, nullable=False)
+    deleted: Mapped[bool] = mapped_column(Boolean, default=False)
+
+
+# ---- Kolejka zleceń renderowania (APP_ROLE=api + python -m app.worker) ----
+
+class RenderJob(Base):
+    __tablename__ = "render_jobs"
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    status: Mapped[str] = mapped_column(String(16), index=True, default="queued")  # queued|running|done|failed
+    priority: Mapped[int] = mapped_column(Integer, default=1, nullable=False)  # 0 = interaktywne, 1 = masowe
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    worker: Mapped[str | None] = mapped_column(String(120))
+    lease_until: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    result: Mapped[bytes | None] = mapped_column(LargeBinary)
+    media_type: Mapped[str | None] = mapped_column(String(64))
+    filename: Mapped[str | None] = mapped_column(String(200))
+    warnings: Mapped[list | None] = mapped_column(JSON)
+    error: Mapped[str | None] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
@@ -0,0 +1,109 @@
+import gzip
+import struct
+import sys
+import zlib
+from typing import Optional
+
+try:  # opcjonalnie: pip install brotli
+    import brotli
+except ImportError:
+    brotli = None
+
+# ---- PNG ----
+# Własny enkoder PNG dla trybów rgb/gray/mono: bierze surowe piksele z powierzchni cairo
+# (ARGB32, premultiplied) i koduje je z wybranym poziomem zlib. Kanały wycinamy
+# slicingiem bajtów, bez pętli po pikselach. Zakładamy nieprzezroczyste strony
+# (każda etykieta i strona ma pełne tło), więc alfę pomijamy.
+
+# kolejność bajtów piksela ARGB32 w pamięci
+_B, _G, _R = (0, 1, 2) if sys.byteorder == "little" else (3, 2, 1)
+# próg czerni dla trybu mono (kanał zielony, tablica do bytes.translate)
+_MONO_LUT = bytes(0 if v < 128 else 1 for v in range(256))
+
+
+def _pack_bits(px: bytes, width: int, height: int) -> bytes:
+    """Pack 0/1 pixels into 1-bit rows (MSB first, each row padded to a byte)."""
+    row = (width + 7) // 8
+    pad = row * 8 - width
+    bits = "".join(px[y * width:(y + 1) * width].decode("latin-1") + "\x00" * pad for y in range(height))
+    # "\x00"/"\x01" → "0"/"1", potem int(…, 2) pakuje całość naraz
+    return int(bits.translate({0: "0", 1: "1"}) or "0", 2).to_bytes(row * height, "big")
+
+
+def _chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def encode_png(data, width: int, height: int, stride: int, mode: str, level: int, dpi: int) -> bytes:
+    """Encode an opaque cairo ARGB32 buffer as PNG.
+
+    ``rgb`` – truecolor 24-bit; ``gray`` – 8-bit grayscale from the green
+    channel (exact for black/white/gray labels); ``mono`` – 1-bit 2-colour
+    palette (black/white threshold), the smallest output for monochrome labels.
+    """
+    buf = bytes(data)
+    if stride != width * 4:
+        buf = b"".join(buf[y * stride:y * stride + width * 4] for y in range(height))
+
+    if mode == "rgb":
+        px = bytearray(width * height * 3)
+        px[0::3] = buf[_R::4]
+        px[1::3] = buf[_G::4]
+        px[2::3] = buf[_B::4]
+        bpp, bit_depth, color_type, palette = 3, 8, 2, None
+    elif mode == "gray":
+        px = buf[_G::4]
+        bpp, bit_depth, color_type, palette = 1, 8, 0, None
+    elif mode == "mono":
+        px = _pack_bits(buf[_G::4].translate(_MONO_LUT), width, height)
+        bpp, bit_depth, color_type, palette = 1, 1, 3, b"\x00\x00\x00\xff\xff\xff"
+    else:
+        raise ValueError("unsupported_png_mode")
+
+    row = (width * bpp * bit_depth + 7) // 8
+    raw = b"".join(b"\x00" + px[y * row:(y + 1) * row] for y in range(height))  # filtr 0 (None)
+    ppm = round(dpi / 0.0254)
+    out = [
+        b"\x89PNG\r\n\x1a\n",
+        _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, bit_depth, color_type, 0, 0, 0)),
+        _chunk(b"pHYs", struct.pack(">IIB", ppm, ppm, 1)),
+    ]
+    if palette:
+        out.append(_chunk(b"PLTE", palette))
+    out.append(_chunk(b"IDAT", zlib.compress(raw, level)))
+    out.append(_chunk(b"IEND", b""))
+    return b"".join(out)
+
+
+# ---- SVG (Content-Encoding) ----
+
+def negotiate_encoding(accept_encoding: str, preference: str) -> Optional[str]:
+    """Pick ``br``/``gzip`` for an SVG response, or None for identity."""
+    if preference == "identity":
+        return None
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, *params = (x.strip() for x in part.split(";"))
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            accepted.add(coding.lower())
+    if preference in ("auto", "br") and "br" in accepted and brotli is not None:
+        return "br"
+    if preference in ("auto", "gzip", "br") and "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def encode_body(content: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(content, quality=level)
+    if encoding == "gzip":
+        return gzip.compress(content, compresslevel=level, mtime=0)
+    raise ValueError("unsupported_encoding")
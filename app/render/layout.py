@@ -1,76 +1,134 @@
+from functools import partial
 from io import BytesIO
-from typing import List, Tuple
-from zipfile import ZipFile
-
-import cairosvg
+from typing import List, Optional, Tuple
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
 
+from app.render.compression import encode_png
+from app.services.profiling import stage
 from app.schemas import SheetDef
+from app.services.registry import SHEET, registry
 
 
 def mm_to_px(mm: float, dpi: int) -> float:
     return (mm / 25.4) * dpi
 
 
+# Skompilowana geometria arkusza: prefiks SVG strony i (otwarcie <g>, znaczniki cięcia) per slot.
+# Klucz to sheet.key – rejestr unieważnia wpis, gdy arkusz się zmieni; na workerze
+# (bez rejestru) zmianę wykrywa porównanie zapisanej definicji.
+_geometry_cache: dict[str, tuple[SheetDef, str, list[tuple[str, str]]]] = {}
+
+
+def _invalidate_geometry(kind: str, key: str):
+    if kind == SHEET:
+        _geometry_cache.pop(key, None)
+
+
+registry.subscribe(_invalidate_geometry)
+
+
+def _sheet_geometry(sheet: SheetDef) -> tuple[str, list[tuple[str, str]]]:
+    cached = _geometry_cache.get(sheet.key)
+    if cached is not None and cached[0] == sheet:
+        return cached[1], cached[2]
+    slots = []
+    for r in range(sheet.rows):
+        for c in range(sheet.cols):
+            x = sheet.margin_left_mm + c * (sheet.label_width_mm + sheet.gutter_x_mm)
+            y = sheet.margin_top_mm + r * (sheet.label_height_mm + sheet.gutter_y_mm)
+            slots.append((f"\n  <g transform='translate({x},{y})'>", _marks(x, y, sheet.label_width_mm, sheet.label_height_mm)))
+    page_head = _empty_page_svg(sheet)
+    _geometry_cache[sheet.key] = (sheet, page_head, slots)
+    return page_head, slots
+
+
 def layout_labels_to_pages(label_svgs: List[tuple[str, float, float]], sheet: SheetDef, with_cut_marks: bool = False):
     pages = []
-    cols, rows = sheet.cols, sheet.rows
-    idx = 0
-    while idx < len(label_svgs):
+    page_head, slots = _sheet_geometry(sheet)
+    per_page = len(slots)
+    for start in range(0, len(label_svgs), per_page):
         # budujemy jedną stronę SVG A4
-        page_svg = _empty_page_svg(sheet)
-        items_on_page = 0
-        for r in range(rows):
-            for c in range(cols):
-                if idx >= len(label_svgs):
-                    break
-                svg, w_mm, h_mm = label_svgs[idx]
-                x = sheet.margin_left_mm + c * (sheet.label_width_mm + sheet.gutter_x_mm)
-                y = sheet.margin_top_mm + r * (sheet.label_height_mm + sheet.gutter_y_mm)
-                page_svg += f"\n  <g transform='translate({x},{y})'>{_embed(svg)}</g>"
-                if with_cut_marks:
-                    page_svg += _marks(x, y, sheet.label_width_mm, sheet.label_height_mm)
-                idx += 1
-                items_on_page += 1
-        page_svg += "\n</svg>"
-        pages.append({"svg": page_svg, "width_mm": sheet.page_width_mm, "height_mm": sheet.page_height_mm})
+        parts = [page_head]
+        for (svg, w_mm, h_mm), (group_open, marks) in zip(label_svgs[start:start + per_page], slots):
+            parts.append(f"{group_open}{_embed(svg)}</g>")
+            if with_cut_marks:
+                parts.append(marks)
+        parts.append("\n</svg>")
+        pages.append({"svg": "".join(parts), "width_mm": sheet.page_width_mm, "height_mm": sheet.page_height_mm})
     return pages
 
 
-def export_svg_pages(pages, fmt: str = "pdf", dpi: int = 300, pdf_title: str = "labels"):
+def export_svg_pages(
+    pages,
+    fmt: str = "pdf",
+    dpi: int = 300,
+    pdf_title: str = "labels",
+    zip_level: Optional[int] = None,
+    png_mode: str = "rgba",
+    png_level: int = 6,
+):
+    """Export laid-out pages; more than one page (or fmt=zip) gives a ZIP.
+
+    ``zip_level`` is the deflate level of ZIP members (0 = stored); by default
+    SVG members are deflated and PDF/PNG members, already compressed, are
+    stored. ``png_mode`` other than ``rgba`` re-encodes PNGs with our own
+    encoder at ``png_level``. PDF streams are always Flate-compressed by cairo.
+    """
     if fmt == "pdf":
         # łączymy strony w PDF – cairosvg nie robi multi-page naraz, więc zip lub pojedynczo.
         # MVP: jeżeli >1 strona, zwracamy ZIP pdf-ów.
-        if len(pages) == 1:
-            buf = cairosvg.svg2pdf(bytestring=pages[0]["svg"].encode("utf-8"))
-            return buf, "application/pdf", f"{pdf_title}.pdf"
-        else:
-            mem = BytesIO()
-            with ZipFile(mem, 'w') as z:
-                for i, p in enumerate(pages, start=1):
-                    pdf_bytes = cairosvg.svg2pdf(bytestring=p["svg"].encode("utf-8"))
-                    z.writestr(f"{pdf_title}_{i:02d}.pdf", pdf_bytes)
-            return mem.getvalue(), "application/zip", f"{pdf_title}.zip"
+        convert, media_type, ext = _svg_to_pdf, "application/pdf", "pdf"
     elif fmt == "png":
-        if len(pages) == 1:
-            png = cairosvg.svg2png(bytestring=pages[0]["svg"].encode("utf-8"), dpi=dpi)
-            return png, "image/png", f"{pdf_title}.png"
-        else:
-            mem = BytesIO()
-            with ZipFile(mem, 'w') as z:
-                for i, p in enumerate(pages, start=1):
-                    png_bytes = cairosvg.svg2png(bytestring=p["svg"].encode("utf-8"), dpi=dpi)
-                    z.writestr(f"{pdf_title}_{i:02d}.png", png_bytes)
-            return mem.getvalue(), "application/zip", f"{pdf_title}.zip"
-    elif fmt == "zip":
-        mem = BytesIO()
-        with ZipFile(mem, 'w') as z:
-            for i, p in enumerate(pages, start=1):
-                svg_bytes = p["svg"].encode("utf-8")
-                z.writestr(f"{pdf_title}_{i:02d}.svg", svg_bytes)
-        return mem.getvalue(), "application/zip", f"{pdf_title}.zip"
+        convert, media_type, ext = partial(_svg_to_png, dpi=dpi, mode=png_mode, level=png_level), "image/png", "png"
+    elif fmt in ("svg", "zip"):
+        convert, media_type, ext = (lambda b: b), "image/svg+xml", "svg"
     else:
         raise ValueError("unsupported_format")
 
+    def convert_page(i: int, page) -> bytes:
+        with stage(f"cairosvg_p{i:02d}" if fmt in ("pdf", "png") else "svg_encode"):
+            return convert(page["svg"].encode("utf-8"))
+
+    if len(pages) == 1 and fmt != "zip":
+        return convert_page(1, pages[0]), media_type, f"{pdf_title}.{ext}"
+
+    if zip_level is None:
+        zip_level = ZIP_DEFAULT_LEVELS[ext]
+    mem = BytesIO()
+    with ZipFile(mem, 'w', compression=ZIP_DEFLATED if zip_level else ZIP_STORED,
+                 compresslevel=zip_level or None) as z:
+        for i, p in enumerate(pages, start=1):
+            data = convert_page(i, p)
+            with stage("zip"):
+                z.writestr(f"{pdf_title}_{i:02d}.{ext}", data)
+    return mem.getvalue(), "application/zip", f"{pdf_title}.zip"
+
+
+# Domyślne poziomy deflate członków ZIP (zob. python -m scripts.bench_render export):
+# SVG kurczy się kilkanaście razy, PDF/PNG są już skompresowane – deflate to strata CPU.
+ZIP_DEFAULT_LEVELS = {"svg": 6, "pdf": 0, "png": 0}
+
+
+def _svg_to_pdf(svg: bytes) -> bytes:
+    # import leniwy – pody API (APP_ROLE=api) nie ładują cairosvg/cairo wcale
+    import cairosvg
+    return cairosvg.svg2pdf(bytestring=svg)
+
+
+def _svg_to_png(svg: bytes, dpi: int, mode: str, level: int) -> bytes:
+    import cairosvg
+    if mode == "rgba":
+        return cairosvg.svg2png(bytestring=svg, dpi=dpi)
+    from cairosvg.parser import Tree
+    from cairosvg.surface import PNGSurface
+
+    surface = PNGSurface(Tree(bytestring=svg), None, dpi)
+    img = surface.cairo
+    img.flush()
+    png = encode_png(img.get_data(), img.get_width(), img.get_height(), img.get_stride(), mode, level, dpi)
+    surface.finish()
+    return png
+
 
 def _empty_page_svg(sheet: SheetDef) -> str:
     return f"<svg xmlns='http://www.w3.org/2000/svg' width='{sheet.page_width_mm}mm' height='{sheet.page_height_mm}mm' viewBox='0 0 {sheet.page_width_mm} {sheet.page_height_mm}'>\n  <rect x='0' y='0' width='{sheet.page_width_mm}' height='{sheet.page_height_mm}' fill='white'/>"
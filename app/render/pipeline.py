@@ -0,0 +1,199 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+from app.render.layout import export_svg_pages, layout_labels_to_pages
+from app.render.svg_renderer import render_label_svg
+from app.schemas import LabelItem, RenderOptions, SheetDef, TypeDef
+from app.services.icons import IconResolver
+from app.services.profiling import is_profiling, stage
+from app.services.registry import TYPE, registry
+from app.services.templates import get_template_by_key
+
+# Wspólny pipeline renderowania dla /labels/* i /storages/*/print-missing.
+# Funkcje są synchroniczne (CPU-bound) – wywołujemy je w threadpoolu.
+
+# Cache SVG pojedynczych etykiet (print-missing powtarza tę samą etykietę N razy).
+# Pierwszy element klucza to klucz typu – rejestr unieważnia tylko jego wpisy; drugi to
+# wymiary/kształt, bo worker dostaje definicje w zleceniu i nie słucha rejestru.
+LABEL_CACHE_SIZE = 2048
+_label_cache: OrderedDict[tuple, tuple[str, float, float, list[str]]] = OrderedDict()
+_label_cache_lock = threading.Lock()
+
+
+def _invalidate_labels(kind: str, key: str):
+    if kind != TYPE:
+        return
+    with _label_cache_lock:
+        for k in [k for k in _label_cache if k[0] == key]:
+            del _label_cache[k]
+
+
+registry.subscribe(_invalidate_labels)
+
+
+def _render_label_cached(item: LabelItem, template: TypeDef, icon_resolver: IconResolver, options: RenderOptions):
+    colors = options.colors_dict()
+    padding_mm = options.padding_mm or 3.0
+    key = (template.key, (template.width_mm, template.height_mm, template.shape),
+           item.title, item.text, item.icon, tuple(sorted(colors.items())), padding_mm,
+           options.text_fit, options.max_lines)
+    # przy profilowaniu omijamy cache, żeby zmierzyć rzeczywisty koszt etykiety
+    if not is_profiling():
+        with _label_cache_lock:
+            hit = _label_cache.get(key)
+            if hit is not None:
+                _label_cache.move_to_end(key)
+                return hit
+    out = render_label_svg(
+        item=item,
+        template=template,
+        icon_resolver=icon_resolver,
+        colors=colors,
+        padding_mm=padding_mm,
+        outline_icons=True,
+        text_fit=options.text_fit,
+        max_lines=options.max_lines,
+    )
+    with _label_cache_lock:
+        _label_cache[key] = out
+        if len(_label_cache) > LABEL_CACHE_SIZE:
+            _label_cache.popitem(last=False)
+    return out
+
+
+def render_batch(
+    items: Iterable[LabelItem],
+    default_type: str,
+    sheet: SheetDef,
+    options: RenderOptions,
+    icon_resolver: IconResolver,
+    fmt: str,
+    pdf_title: str,
+    per_item_type: bool = False,
+    resolve_template: Callable[[str], Optional[TypeDef]] = get_template_by_key,
+) -> tuple[Optional[tuple[bytes, str, str]], list[str]]:
+    """Render items onto sheet pages and export them.
+
+    With ``per_item_type`` items may override the template via ``meta.type``;
+    unknown types are skipped with an ``unknown_type:`` warning. Returns ``(None, warnings)``
+    when nothing was renderable.
+    """
+    warnings: list[str] = []
+    label_svgs: list[tuple[str, float, float]] = []
+    for item in items:
+        tpl_key = default_type
+        if per_item_type:
+            tpl_key = (item.meta or {}).get("type", default_type)
+        tpl = resolve_template(tpl_key)
+        if not tpl:
+            warnings.append(f"unknown_type:{tpl_key}")
+            continue
+        with stage("svg_build"):
+            svg, w_mm, h_mm, item_warn = _render_label_cached(item, tpl, icon_resolver, options)
+        if item_warn:
+            warnings.extend(item_warn)
+        label_svgs.append((svg, w_mm, h_mm))
+
+    if not label_svgs:
+        return None, warnings
+
+    with stage("layout"):
+        pages = layout_labels_to_pages(
+            label_svgs=label_svgs,
+            sheet=sheet,
+            with_cut_marks=options.with_cut_marks or False,
+        )
+    exported = export_svg_pages(
+        pages=pages,
+        fmt=fmt,
+        dpi=options.dpi or 300,
+        pdf_title=pdf_title,
+        **options.export_dict(),
+    )
+    return exported, warnings
+
+
+def render_single(
+    item: LabelItem,
+    template: TypeDef,
+    options: RenderOptions,
+    icon_resolver: IconResolver,
+    fmt: str,
+) -> tuple[tuple[bytes, str, str], list[str]]:
+    """Render one label as its own page (vector PDF; PNG at given DPI)."""
+    with stage("svg_build"):
+        svg, w_mm, h_mm, warnings = _render_label_cached(item, template, icon_resolver, options)
+    exported = export_svg_pages(
+        pages=[{"svg": svg, "width_mm": w_mm, "height_mm": h_mm}],
+        fmt=fmt,
+        dpi=options.dpi or 300,
+        pdf_title="label",
+        **options.export_dict(),
+    )
+    return exported, list(warnings)
+
+
+# ---- Zlecenia dla workerów renderujących ----
+# Zlecenie to JSON z kompletem danych (także definicjami typów i arkusza),
+# więc worker nie potrzebuje rejestru ani dostępu do bazy, by wyrenderować etykiety.
+
+def batch_job(
+    items: list[LabelItem],
+    default_type: str,
+    sheet: SheetDef,
+    options: RenderOptions,
+    fmt: str,
+    pdf_title: str,
+    per_item_type: bool = False,
+) -> dict:
+    keys = {default_type}
+    if per_item_type:
+        keys.update((it.meta or {}).get("type", default_type) for it in items)
+    templates = {k: t.model_dump() for k in keys if (t := get_template_by_key(k))}
+    return {
+        "kind": "batch",
+        "items": [it.model_dump() for it in items],
+        "default_type": default_type,
+        "templates": templates,
+        "sheet": sheet.model_dump(),
+        "options": options.model_dump(),
+        "fmt": fmt,
+        "pdf_title": pdf_title,
+        "per_item_type": per_item_type,
+    }
+
+
+def single_job(item: LabelItem, template: TypeDef, options: RenderOptions, fmt: str) -> dict:
+    return {
+        "kind": "single",
+        "item": item.model_dump(),
+        "template": template.model_dump(),
+        "options": options.model_dump(),
+        "fmt": fmt,
+    }
+
+
+def run_render_job(job: dict, icon_resolver: IconResolver) -> tuple[Optional[tuple[bytes, str, str]], list[str]]:
+    """Execute a job built by :func:`batch_job` / :func:`single_job` (in-process or on a worker)."""
+    options = RenderOptions.model_validate(job["options"])
+    if job["kind"] == "single":
+        return render_single(
+            item=LabelItem.model_validate(job["item"]),
+            template=TypeDef.model_validate(job["template"]),
+            options=options,
+            icon_resolver=icon_resolver,
+            fmt=job["fmt"],
+        )
+    templates = {k: TypeDef.model_validate(v) for k, v in job["templates"].items()}
+    return render_batch(
+        items=[LabelItem.model_validate(it) for it in job["items"]],
+        default_type=job["default_type"],
+        sheet=SheetDef.model_validate(job["sheet"]),
+        options=options,
+        icon_resolver=icon_resolver,
+        fmt=job["fmt"],
+        pdf_title=job["pdf_title"],
+        per_item_type=job["per_item_type"],
+        resolve_template=templates.get,
+    )
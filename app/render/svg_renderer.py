@@ -1,13 +1,21 @@
 from typing import Optional, Tuple
+from urllib.parse import quote
 
+from app.render.text_metrics import (LINE_HEIGHT, PRIMARY_FAMILY, fit_text,
+                                     get_metrics)
 from app.schemas import LabelItem
 from app.services.icons import IconResolver
+from app.services.profiling import stage
 from app.services.templates import TypeDef
 
 SVG_NS = "http://www.w3.org/2000/svg"
 
 # Prosty layout tekstu – przyjmujemy stałe fonty
-FONT_FAMILY = "Inter, 'Noto Color Emoji', sans-serif"
+FONT_FAMILY = f"{PRIMARY_FAMILY}, 'Noto Color Emoji', sans-serif"
+
+# Minimalne rozmiary (mm) przy auto-dopasowaniu – poniżej tego tekst się ucina z "…"
+TITLE_MIN_MM = 2.5
+TEXT_MIN_MM = 1.8
 
 
 def escape(text: str) -> str:
@@ -21,13 +29,16 @@ def render_label_svg(
     colors: dict,
     padding_mm: float = 3.0,
     outline_icons: bool = True,
+    text_fit: str = "wrap",  # jak RenderOptions.text_fit
+    max_lines: int = 2,
 ) -> Tuple[str, float, float, list[str]]:
     w = template.width_mm
     h = template.height_mm
     warnings: list[str] = []
 
     # ikona
-    icon_svg, iwarn = icon_resolver.load_icon_svg(item.icon)
+    with stage("icon_load"):
+        icon_svg, iwarn = icon_resolver.load_icon_svg(item.icon)
     warnings.extend(iwarn)
 
     # proste marginesy
@@ -63,10 +74,23 @@ def render_label_svg(
         text_x = padding_mm + icon_size + (padding_mm * 0.5)
 
     # Tekst – tytuł i opis
-    title = escape(item.title)
-    text = escape(item.text or "")
-    title_y = padding_mm + (inner_h * 0.45)
-    text_y = title_y + min(inner_h*0.28, 7)
+    avail_w = w - padding_mm - text_x
+    title_max = min(inner_h*0.35, 10)
+    text_max = min(inner_h*0.22, 6)
+    if text_fit == "off":
+        title = escape(item.title)
+        text = escape(item.text or "")
+        title_y = padding_mm + (inner_h * 0.45)
+        text_y = title_y + min(inner_h*0.28, 7)
+        text_block = (
+            f"<text class='title' x='{text_x:.2f}' y='{title_y:.2f}'>{title}</text>\n"
+            f"      <text class='text' x='{text_x:.2f}' y='{text_y:.2f}'>{text}</text>"
+        )
+        # bez ostrzeżeń o przepełnieniu: rozmiary w "mm" z CSS cairosvg przelicza przez dpi,
+        # więc tabela szerokości nie odpowiada temu, co faktycznie zostanie narysowane
+    else:
+        text_block = _fitted_text_block(item, warnings, text_x, avail_w, padding_mm, inner_h,
+                                        title_max, text_max, max_lines if text_fit == "wrap" else 1)
 
     content = f"""
     <svg xmlns='{SVG_NS}' width='{w}mm' height='{h}mm' viewBox='0 0 {w} {h}'>
@@ -74,8 +98,48 @@ def render_label_svg(
       <rect class='root' x='0' y='0' width='{w}' height='{h}' fill='{colors.get('bg','#fff')}'/>
       {border}
       {icon_block}
-      <text class='title' x='{text_x:.2f}' y='{title_y:.2f}'>{title}</text>
-      <text class='text' x='{text_x:.2f}' y='{text_y:.2f}'>{text}</text>
+      {text_block}
     </svg>
     """.strip()
-    return content, w, h, warnings
\ No newline at end of file
+    return content, w, h, warnings
+
+
+def _fitted_text_block(
+    item: LabelItem,
+    warnings: list[str],
+    text_x: float,
+    avail_w: float,
+    padding_mm: float,
+    inner_h: float,
+    title_max: float,
+    text_max: float,
+    max_lines: int,
+) -> str:
+    """Shrink/wrap title and text into the free area and center them vertically.
+
+    Sizes are emitted in user units (mm of the label viewBox), so they match
+    what the metrics table measured.
+    """
+    gap = inner_h * 0.06 if item.text else 0.0
+    title_box_h = inner_h * 0.6 if item.text else inner_h
+    title_lines, title_size, title_over = fit_text(
+        item.title, get_metrics(True), avail_w, title_box_h, title_max, TITLE_MIN_MM, max_lines)
+    used_h = len(title_lines) * title_size * LINE_HEIGHT
+    text_lines, text_size, text_over = fit_text(
+        item.text or "", get_metrics(False), avail_w, max(inner_h - used_h - gap, 0.0), text_max, TEXT_MIN_MM, max_lines)
+    if title_over:
+        warnings.append(f"text_overflow:title:{quote(item.title[:40])}")
+    if text_over:
+        warnings.append(f"text_overflow:text:{quote((item.text or '')[:40])}")
+
+    block_h = used_h + (gap + len(text_lines) * text_size * LINE_HEIGHT if text_lines else 0.0)
+    y = padding_mm + max(inner_h - block_h, 0.0) / 2
+    out = []
+    for cls, lines, size in (("title", title_lines, title_size), ("text", text_lines, text_size)):
+        for line in lines:
+            # linia bazowa: połowa interlinii + ok. 0.8 em wysokości kapitaliki
+            baseline = y + size * ((LINE_HEIGHT - 1) / 2 + 0.8)
+            out.append(f"<text class='{cls}' x='{text_x:.2f}' y='{baseline:.2f}' style='font-size:{size:.2f}px'>{escape(line)}</text>")
+            y += size * LINE_HEIGHT
+        y += gap
+    return "\n      ".join(out)
@@ -0,0 +1,277 @@
+import logging
+import shutil
+import struct
+import subprocess
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+FONTS_DIR = "assets/fonts"
+# rodzina, o którą cairosvg pyta fontconfig (pierwsza z FONT_FAMILY w svg_renderer)
+PRIMARY_FAMILY = "Inter"
+ELLIPSIS = "…"
+LINE_HEIGHT = 1.2  # wysokość linii jako wielokrotność rozmiaru fontu
+
+# Szerokości DejaVu Sans / DejaVu Sans Bold (jednostki /1000 em) dla ASCII 32..126 – zapas,
+# gdy nie da się odczytać fontu. To font, którym obraz (fonts-dejavu) rysuje bez Inter,
+# więc pomiar nie zaniża szerokości; Inter jest od niego węższy.
+_FALLBACK_ASCII = (
+    318, 401, 460, 838, 636, 950, 780, 275, 390, 390, 500, 838, 318, 361, 318, 337,
+    636, 636, 636, 636, 636, 636, 636, 636, 636, 636, 337, 337, 838, 838, 838, 531,
+    1000, 684, 686, 698, 770, 632, 575, 775, 752, 295, 295, 656, 557, 863, 748, 787,
+    603, 787, 695, 635, 611, 732, 684, 989, 685, 611, 685, 390, 337, 390, 838, 500,
+    500, 613, 635, 550, 635, 615, 352, 635, 634, 278, 278, 579, 278, 974, 634, 612,
+    635, 635, 411, 521, 392, 634, 592, 818, 592, 592, 525, 636, 337, 636, 838,
+)
+_FALLBACK_ASCII_BOLD = (
+    348, 456, 521, 838, 696, 1002, 872, 306, 457, 457, 523, 838, 380, 415, 380, 365,
+    696, 696, 696, 696, 696, 696, 696, 696, 696, 696, 400, 400, 838, 838, 838, 580,
+    1000, 774, 762, 734, 830, 683, 683, 821, 837, 372, 372, 775, 637, 995, 837, 850,
+    733, 850, 770, 720, 682, 812, 774, 1103, 771, 724, 725, 457, 365, 457, 838, 500,
+    500, 675, 716, 593, 716, 678, 435, 716, 712, 343, 343, 665, 343, 1042, 712, 687,
+    716, 716, 493, 595, 478, 712, 652, 924, 645, 652, 582, 712, 365, 712, 838,
+)
+
+
+class FontMetrics:
+    """Glyph advance table for one font face, in em units.
+
+    Widths ignore kerning and shaping, which is close enough for deciding
+    where to wrap or how far to shrink. String widths are memoized, since
+    bulk runs repeat the same titles many times.
+    """
+
+    def __init__(self, advances: dict[int, float], default_advance: float, scale: float = 1.0, name: str = "fallback"):
+        self.advances = advances
+        self.default_advance = default_advance
+        self.scale = scale
+        self.name = name
+        self.em_width = lru_cache(maxsize=16384)(self._em_width)
+
+    def char_advance(self, ch: str) -> float:
+        cp = ord(ch)
+        adv = self.advances.get(cp)
+        if adv is None:
+            # znaki z diakrytykami (ą, ł, ż…) – szerokość litery bazowej
+            base = unicodedata.normalize("NFD", ch)[:1]
+            adv = self.advances.get(ord(base), self.default_advance) if base else self.default_advance
+        return adv
+
+    def _em_width(self, text: str) -> float:
+        return sum(self.char_advance(ch) for ch in text) * self.scale
+
+    def width(self, text: str, size: float) -> float:
+        return self.em_width(text) * size
+
+
+def _fallback_metrics(bold: bool) -> FontMetrics:
+    table = _FALLBACK_ASCII_BOLD if bold else _FALLBACK_ASCII
+    advances = {32 + i: w / 1000 for i, w in enumerate(table)}
+    return FontMetrics(advances, advances[ord("n")], name="fallback-bold" if bold else "fallback")
+
+
+def _read_sfnt_advances(data: bytes) -> tuple[dict[int, float], float]:
+    """Parse cmap + hmtx from a TrueType/OpenType font (first face of a collection)."""
+    base = 0
+    if data[:4] == b"ttcf":
+        base = struct.unpack_from(">I", data, 12)[0]
+    num_tables = struct.unpack_from(">H", data, base + 4)[0]
+    tables = {}
+    for i in range(num_tables):
+        tag, _, off, length = struct.unpack_from(">4sIII", data, base + 12 + 16 * i)
+        tables[tag.decode("latin-1")] = off
+
+    units_per_em = struct.unpack_from(">H", data, tables["head"] + 18)[0]
+    n_hmetrics = struct.unpack_from(">H", data, tables["hhea"] + 34)[0]
+    hmtx = tables["hmtx"]
+    glyph_adv = [struct.unpack_from(">H", data, hmtx + 4 * i)[0] for i in range(n_hmetrics)]
+
+    def adv(gid: int) -> float:
+        return glyph_adv[min(gid, n_hmetrics - 1)] / units_per_em
+
+    cmap = tables["cmap"]
+    n_sub = struct.unpack_from(">H", data, cmap + 2)[0]
+    subtables = {}
+    for i in range(n_sub):
+        pid, eid, off = struct.unpack_from(">HHI", data, cmap + 4 + 8 * i)
+        subtables[(pid, eid)] = cmap + off
+
+    advances: dict[int, float] = {}
+    for key in ((3, 10), (0, 4), (3, 1), (0, 3)):
+        sub = subtables.get(key)
+        if sub is None:
+            continue
+        fmt = struct.unpack_from(">H", data, sub)[0]
+        if fmt == 12:
+            n_groups = struct.unpack_from(">I", data, sub + 12)[0]
+            for g in range(n_groups):
+                start, end, gid = struct.unpack_from(">III", data, sub + 16 + 12 * g)
+                for cp in range(start, min(end, 0x2FFFF) + 1):
+                    advances[cp] = adv(gid + cp - start)
+            break
+        if fmt == 4:
+            seg_x2 = struct.unpack_from(">H", data, sub + 6)[0]
+            ends = sub + 14
+            starts = ends + seg_x2 + 2
+            deltas = starts + seg_x2
+            range_offs = deltas + seg_x2
+            for s in range(seg_x2 // 2):
+                end = struct.unpack_from(">H", data, ends + 2 * s)[0]
+                start = struct.unpack_from(">H", data, starts + 2 * s)[0]
+                delta = struct.unpack_from(">h", data, deltas + 2 * s)[0]
+                ro_pos = range_offs + 2 * s
+                ro = struct.unpack_from(">H", data, ro_pos)[0]
+                for cp in range(start, end + 1):
+                    if cp == 0xFFFF:
+                        continue
+                    if ro == 0:
+                        gid = (cp + delta) & 0xFFFF
+                    else:
+                        gid = struct.unpack_from(">H", data, ro_pos + ro + 2 * (cp - start))[0]
+                        if gid:
+                            gid = (gid + delta) & 0xFFFF
+                    if gid:
+                        advances[cp] = adv(gid)
+            break
+
+    default = advances.get(ord("n"), 0.55)
+    return advances, default
+
+
+def _find_font(font_dir: Path, bold: bool) -> Optional[Path]:
+    if not font_dir.is_dir():
+        return None
+    files = sorted(p for p in font_dir.iterdir() if p.suffix.lower() in (".ttf", ".otf", ".ttc"))
+    files = [p for p in files if "inter" in p.name.lower()] or files
+    files = [p for p in files if "italic" not in p.name.lower() and "emoji" not in p.name.lower()]
+    bold_files = [p for p in files if "bold" in p.name.lower() and "semi" not in p.name.lower() and "extra" not in p.name.lower()]
+    regular = [p for p in files if p not in bold_files]
+    if bold and bold_files:
+        return bold_files[0]
+    for p in regular:
+        if "regular" in p.name.lower():
+            return p
+    return regular[0] if regular else (files[0] if files else None)
+
+
+def _fontconfig_match(family: str, bold: bool) -> Optional[Path]:
+    """The file fontconfig resolves ``family`` to – the face cairo will actually draw."""
+    fc_match = shutil.which("fc-match")
+    if not fc_match:
+        return None
+    try:
+        out = subprocess.run([fc_match, "-f", "%{file}", f"{family}:weight={'bold' if bold else 'regular'}"],
+                             capture_output=True, text=True, timeout=5, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return Path(out) if out and Path(out).is_file() else None
+
+
+@lru_cache(maxsize=None)
+def get_metrics(bold: bool = False, font_dir: str = FONTS_DIR) -> FontMetrics:
+    """Load the glyph advance table once per process.
+
+    Prefers the face fontconfig picks for :data:`PRIMARY_FAMILY` (what cairosvg
+    draws with), then a font from ``font_dir``, then built-in DejaVu Sans widths.
+    """
+    path = _fontconfig_match(PRIMARY_FAMILY, bold) or _find_font(Path(font_dir), bold)
+    if path is not None:
+        try:
+            advances, default = _read_sfnt_advances(path.read_bytes())
+            if advances:
+                # font bez odmiany bold – cairo pogrubia syntetycznie, ok. 6% szerzej
+                synthetic_bold = bold and "bold" not in path.name.lower()
+                return FontMetrics(advances, default, scale=1.06 if synthetic_bold else 1.0, name=path.name)
+        except (KeyError, struct.error, OSError):
+            log.warning("cannot read font metrics from %s, using fallback", path)
+    return _fallback_metrics(bold)
+
+
+# ---- łamanie i dopasowanie tekstu ----
+
+def _split_long_word(word: str, metrics: FontMetrics, size: float, max_width: float) -> list[str]:
+    parts, cur = [], ""
+    for ch in word:
+        if cur and metrics.width(cur + ch, size) > max_width:
+            parts.append(cur)
+            cur = ch
+        else:
+            cur += ch
+    if cur:
+        parts.append(cur)
+    return parts
+
+
+def wrap_text(text: str, metrics: FontMetrics, size: float, max_width: float) -> list[str]:
+    """Greedy word wrap; words wider than a line are broken by characters."""
+    lines: list[str] = []
+    cur = ""
+    for word in text.split():
+        candidate = f"{cur} {word}" if cur else word
+        if metrics.width(candidate, size) <= max_width:
+            cur = candidate
+            continue
+        if cur:
+            lines.append(cur)
+        if metrics.width(word, size) <= max_width:
+            cur = word
+        else:
+            *full, cur = _split_long_word(word, metrics, size, max_width)
+            lines.extend(full)
+    if cur:
+        lines.append(cur)
+    return lines
+
+
+def ellipsize(text: str, metrics: FontMetrics, size: float, max_width: float) -> str:
+    if metrics.width(text, size) <= max_width:
+        return text
+    while text and metrics.width(text.rstrip() + ELLIPSIS, size) > max_width:
+        text = text[:-1]
+    return text.rstrip() + ELLIPSIS
+
+
+def fit_text(
+    text: str,
+    metrics: FontMetrics,
+    max_width: float,
+    max_height: float,
+    max_size: float,
+    min_size: float,
+    max_lines: int = 1,
+) -> tuple[list[str], float, bool]:
+    """Find the largest size in ``[min_size, max_size]`` at which ``text`` fits.
+
+    Tries at most ``max_lines`` wrapped lines within the box. If nothing fits
+    at ``min_size``, the text is cut to ``max_lines`` with an ellipsis and
+    the overflow flag is set; with no room at all (``max_size`` or
+    ``max_width`` <= 0) no lines are returned. Returns ``(lines, size, overflow)``.
+    """
+    if not text.strip():
+        return [], max_size, False
+    if max_size <= 0 or max_width <= 0:
+        # brak miejsca (np. padding ≥ połowy etykiety) – nic się nie zmieści
+        return [], max(max_size, 0.0), True
+    size = max_size
+    while True:
+        lines_cap = max(1, min(max_lines, int(max_height // (size * LINE_HEIGHT)) or 1))
+        if lines_cap == 1:
+            if metrics.width(text, size) <= max_width:
+                return [text], size, False
+        else:
+            lines = wrap_text(text, metrics, size, max_width)
+            if len(lines) <= lines_cap:
+                return lines, size, False
+        if size <= min_size:
+            break
+        size = max(min_size, size * 0.92)
+
+    lines = wrap_text(text, metrics, size, max_width) or [text.strip()]
+    if len(lines) > lines_cap:
+        rest = " ".join(lines[lines_cap - 1:])
+        lines = lines[:lines_cap - 1] + [rest]
+    lines[-1] = ellipsize(lines[-1], metrics, size, max_width)
+    return lines, size, True
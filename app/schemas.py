@@ -20,10 +20,23 @@ class RenderOptions(BaseModel):
     bg: Optional[str] = "#ffffff"
     color: Optional[str] = "#111827"
     border: Optional[str] = "#111827"
+    # auto-dopasowanie tekstu: off – stałe rozmiary, shrink – zmniejszanie w 1 linii, wrap – do max_lines linii
+    text_fit: Literal["off", "shrink", "wrap"] = "wrap"
+    max_lines: conint(ge=1, le=4) = 2
+    # rozmiar wyjścia: deflate członków ZIP (None = domyślny dla formatu, 0 = bez kompresji),
+    # tryb/poziom PNG (rgba = enkoder cairo; rgb/gray/mono = własny) i kodowanie odpowiedzi SVG
+    zip_level: Optional[conint(ge=0, le=9)] = None
+    png_mode: Literal["rgba", "rgb", "gray", "mono"] = "rgba"
+    png_level: conint(ge=0, le=9) = 6
+    svg_encoding: Literal["auto", "gzip", "br", "identity"] = "auto"
+    svg_level: conint(ge=1, le=9) = 6
 
     def colors_dict(self):
         return {"bg": self.bg, "color": self.color, "border": self.border}
 
+    def export_dict(self):
+        return {"zip_level": self.zip_level, "png_mode": self.png_mode, "png_level": self.png_level}
+
 class LabelBatchRequest(BaseModel):
     type: str
     items: List[LabelItem]
@@ -35,28 +48,28 @@ class LabelSingleRequest(BaseModel):
     options: RenderOptions = RenderOptions()
 
 class TypeDef(BaseModel):
-    key: str
-    name: str
-    width_mm: float
-    height_mm: float
+    key: str = Field(min_length=1, max_length=64)
+    name: str = Field(max_length=200)
+    width_mm: float = Field(gt=0)
+    height_mm: float = Field(gt=0)
     shape: Literal["rect", "round", "oval"]
 
 class TypeListResponse(BaseModel):
     types: List[TypeDef]
 
 class SheetDef(BaseModel):
-    key: str
-    name: str
-    page_width_mm: float
-    page_height_mm: float
-    cols: int
-    rows: int
-    label_width_mm: float
-    label_height_mm: float
-    margin_top_mm: float
-    margin_left_mm: float
-    gutter_x_mm: float
-    gutter_y_mm: float
+    key: str = Field(min_length=1, max_length=64)
+    name: str = Field(max_length=200)
+    page_width_mm: float = Field(gt=0)
+    page_height_mm: float = Field(gt=0)
+    cols: int = Field(gt=0)
+    rows: int = Field(gt=0)
+    label_width_mm: float = Field(gt=0)
+    label_height_mm: float = Field(gt=0)
+    margin_top_mm: float = Field(ge=0)
+    margin_left_mm: float = Field(ge=0)
+    gutter_x_mm: float = Field(ge=0)
+    gutter_y_mm: float = Field(ge=0)
 
 class SheetListResponse(BaseModel):
     sheets: List[SheetDef]
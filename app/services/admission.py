@@ -0,0 +1,309 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+from app.config import settings
+
+# Klasy priorytetu: interaktywne (single/preview) mają pierwszeństwo przed masowymi.
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, BULK)
+
+# Względny koszt strony wg formatu – SVG/ZIP to tylko składanie tekstu,
+# PDF to cairosvg, PNG dodatkowo rośnie z dpi² (rasteryzacja).
+FORMAT_PAGE_COST = {"zip": 0.5, "svg": 0.5, "pdf": 4.0, "png": 4.0}
+
+
+def estimate_cost(items: int, pages: int, dpi: int, fmt: str) -> float:
+    """Estimate render cost in "label units" (one label SVG build == 1.0).
+
+    Every label costs one unit; every exported page adds a per-format
+    weight, scaled by (dpi/300)² for raster output only.
+    """
+    page_cost = FORMAT_PAGE_COST.get(fmt, FORMAT_PAGE_COST["pdf"])
+    if fmt == "png":
+        page_cost *= (max(dpi, 1) / 300) ** 2
+    return float(items) + pages * page_cost
+
+
+def pages_for(items: int, per_page: int) -> int:
+    return max(1, math.ceil(items / max(per_page, 1)))
+
+
+def batch_priority(preview: bool, cost: float) -> str:
+    """Previews are interactive only while cheap, so ``?preview=1`` cannot lift a bulk batch."""
+    return INTERACTIVE if preview and cost <= settings.ADMISSION_PREVIEW_MAX_COST else BULK
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: affinity mask capped by the cgroup CPU quota (containers)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:  # cgroup v2: "max 100000" albo "200000 100000"
+        q, period = open("/sys/fs/cgroup/cpu.max").read().split()
+        if q != "max":
+            quota = int(q) / int(period)
+    except (OSError, ValueError):
+        try:  # cgroup v1
+            q = int(open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read())
+            period = int(open("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read())
+            if q > 0 and period > 0:
+                quota = q / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
+
+
+def client_key(request: Request) -> str:
+    """Identify the caller by peer address.
+
+    ``X-Client-Id`` is honoured only with ``ADMISSION_TRUST_CLIENT_ID`` (set by a
+    trusted proxy or auth layer); otherwise any client could pick a fresh id per
+    request and bypass its per-client limits.
+    """
+    cid = request.headers.get("x-client-id") if settings.ADMISSION_TRUST_CLIENT_ID else None
+    if cid:
+        return cid[:64]
+    return request.client.host if request.client else "anonymous"
+
+
+@dataclass
+class _Ticket:
+    client: str
+    priority: str
+    cost: float
+    enqueued_at: float
+    future: asyncio.Future
+
+
+@dataclass
+class _ClassStats:
+    admitted: int = 0
+    rejected_client: int = 0
+    rejected_overload: int = 0
+    timed_out: int = 0
+    wait_total_s: float = 0.0
+    wait_max_s: float = 0.0
+    recent_waits: deque = field(default_factory=lambda: deque(maxlen=1024))
+
+    def snapshot(self) -> dict:
+        waits = sorted(self.recent_waits)
+
+        def pct(p: float) -> float:
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(p * len(waits)))] * 1000
+
+        return {
+            "admitted": self.admitted,
+            "rejected_client": self.rejected_client,
+            "rejected_overload": self.rejected_overload,
+            "timed_out": self.timed_out,
+            "queue_wait_ms_avg": (self.wait_total_s / self.admitted * 1000) if self.admitted else 0.0,
+            "queue_wait_ms_p50": pct(0.50),
+            "queue_wait_ms_p95": pct(0.95),
+            "queue_wait_ms_max": self.wait_max_s * 1000,
+        }
+
+
+class AdmissionController:
+    """Cost-aware admission and weighted priority scheduling for render work.
+
+    At most ``max_concurrency`` renders run at once; the rest wait in one
+    FIFO per priority class. Free slots are handed out by stride scheduling,
+    so a class with weight 4 gets four slots for every one of a weight-1
+    class while both have waiters. Bulk work never holds the last
+    ``interactive_reserved`` slots, so a single label does not wait for a
+    whole batch to finish. Per-client concurrency and cost budgets
+    are enforced on entry (429), and a full queue or a wait longer than
+    ``max_queue_wait_s`` is rejected with 503.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        weights: dict[str, int],
+        client_concurrency: int,
+        client_cost_budget: float,
+        max_queue_cost: float,
+        max_queue_wait_s: float,
+        interactive_reserved: int = 0,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        # przy jednym slocie nie ma czego rezerwować – bulk musi móc ruszyć
+        self.class_limit = {INTERACTIVE: self.max_concurrency,
+                            BULK: max(1, self.max_concurrency - max(0, interactive_reserved))}
+        self.weights = {p: max(1, weights.get(p, 1)) for p in PRIORITIES}
+        self.client_concurrency = client_concurrency
+        self.client_cost_budget = client_cost_budget
+        self.max_queue_cost = max_queue_cost
+        self.max_queue_wait_s = max_queue_wait_s
+
+        self._queues: dict[str, deque[_Ticket]] = {p: deque() for p in PRIORITIES}
+        self._pass: dict[str, float] = {p: 0.0 for p in PRIORITIES}
+        self._vtime = 0.0
+        self._running = 0
+        self._running_by: dict[str, int] = {p: 0 for p in PRIORITIES}
+        self._queued_cost = 0.0
+        self._client_active: dict[str, int] = {}
+        self._client_cost: dict[str, float] = {}
+        self._stats: dict[str, _ClassStats] = {p: _ClassStats() for p in PRIORITIES}
+
+    # ---- public API ----
+
+    @asynccontextmanager
+    async def admit(self, client: str, priority: str, cost: float):
+        """Hold a render slot for the duration of the block; yields queue wait in seconds."""
+        stats = self._stats[priority]
+        self._check_client(client, cost, stats)
+
+        self._client_active[client] = self._client_active.get(client, 0) + 1
+        self._client_cost[client] = self._client_cost.get(client, 0.0) + cost
+        try:
+            waited = await self._acquire(client, priority, cost, stats)
+            try:
+                yield waited
+            finally:
+                self._release(priority)
+        finally:
+            self._client_active[client] -= 1
+            self._client_cost[client] -= cost
+            if self._client_active[client] <= 0:
+                self._client_active.pop(client, None)
+                self._client_cost.pop(client, None)
+
+    def metrics(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self._running,
+            "running_by_class": dict(self._running_by),
+            "class_limit": dict(self.class_limit),
+            "queued": {p: len(q) for p, q in self._queues.items()},
+            "queued_cost": self._queued_cost,
+            "active_clients": len(self._client_active),
+            "classes": {p: s.snapshot() for p, s in self._stats.items()},
+        }
+
+    # ---- internals ----
+
+    def _check_client(self, client: str, cost: float, stats: _ClassStats):
+        active = self._client_active.get(client, 0)
+        if active >= self.client_concurrency:
+            stats.rejected_client += 1
+            raise HTTPException(status_code=429, detail="Too many concurrent render requests",
+                                headers={"Retry-After": "1"})
+        # pojedyncze duże zlecenie przechodzi, jeżeli klient nie ma nic w toku
+        if active and self._client_cost.get(client, 0.0) + cost > self.client_cost_budget:
+            stats.rejected_client += 1
+            raise HTTPException(status_code=429, detail="Render cost budget exceeded",
+                                headers={"Retry-After": "2"})
+
+    async def _acquire(self, client: str, priority: str, cost: float, stats: _ClassStats) -> float:
+        # po każdym _dispatch czekają tylko klasy, które nie mogą ruszyć (limit klasy),
+        # więc wolny slot dla tej klasy można zająć od razu, jeśli nikt z niej nie czeka
+        if self._can_start(priority) and not self._queues[priority]:
+            self._running += 1
+            self._running_by[priority] += 1
+            stats.admitted += 1
+            stats.recent_waits.append(0.0)
+            return 0.0
+
+        if self._queued_cost + cost > self.max_queue_cost:
+            stats.rejected_overload += 1
+            raise HTTPException(status_code=503, detail="Render queue full",
+                                headers={"Retry-After": "5"})
+
+        ticket = _Ticket(client, priority, cost, time.monotonic(),
+                         asyncio.get_running_loop().create_future())
+        if not self._queues[priority]:
+            # klasa wraca z bezczynności – nie może "oszczędzać" kredytu na później
+            self._pass[priority] = max(self._pass[priority], self._vtime)
+        self._queues[priority].append(ticket)
+        self._queued_cost += cost
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), timeout=self.max_queue_wait_s)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if ticket.future.done():
+                # slot przydzielony w ostatniej chwili – oddajemy go
+                self._release(priority)
+            else:
+                ticket.future.cancel()
+                self._queues[priority].remove(ticket)
+                self._queued_cost -= cost
+            if isinstance(e, asyncio.TimeoutError):
+                stats.timed_out += 1
+                raise HTTPException(status_code=503, detail="Render queue timeout",
+                                    headers={"Retry-After": "5"})
+            raise
+
+        waited = time.monotonic() - ticket.enqueued_at
+        stats.admitted += 1
+        stats.wait_total_s += waited
+        stats.wait_max_s = max(stats.wait_max_s, waited)
+        stats.recent_waits.append(waited)
+        return waited
+
+    def _can_start(self, priority: str) -> bool:
+        return self._running < self.max_concurrency and self._running_by[priority] < self.class_limit[priority]
+
+    def _release(self, priority: str):
+        self._running -= 1
+        self._running_by[priority] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._running < self.max_concurrency:
+            ready = [p for p in PRIORITIES if self._queues[p] and self._can_start(p)]
+            if not ready:
+                return
+            # stride scheduling: najmniejszy "pass" wygrywa, krok = 1/waga
+            prio = min(ready, key=lambda p: self._pass[p])
+            self._vtime = self._pass[prio]
+            self._pass[prio] += 1.0 / self.weights[prio]
+            ticket = self._queues[prio].popleft()
+            self._queued_cost -= ticket.cost
+            self._running += 1
+            self._running_by[prio] += 1
+            ticket.future.set_result(None)
+
+
+def _from_settings() -> AdmissionController:
+    if settings.APP_ROLE == "api":
+        # slot trwa do końca oczekiwania na workera, więc limitem są zlecenia w toku, nie CPU
+        max_concurrency = settings.JOB_MAX_INFLIGHT
+    else:
+        max_concurrency = settings.RENDER_CONCURRENCY or available_cpus()
+    return AdmissionController(
+        max_concurrency=max_concurrency,
+        weights={INTERACTIVE: settings.ADMISSION_WEIGHT_INTERACTIVE, BULK: settings.ADMISSION_WEIGHT_BULK},
+        client_concurrency=settings.ADMISSION_CLIENT_CONCURRENCY,
+        client_cost_budget=settings.ADMISSION_CLIENT_COST_BUDGET,
+        max_queue_cost=settings.ADMISSION_MAX_QUEUE_COST,
+        max_queue_wait_s=settings.ADMISSION_MAX_QUEUE_WAIT_S,
+        interactive_reserved=settings.ADMISSION_INTERACTIVE_RESERVED,
+    )
+
+
+admission: Optional[AdmissionController] = _from_settings() if settings.ADMISSION_ENABLED else None
+
+
+@asynccontextmanager
+async def render_slot(request: Request, priority: str, cost: float):
+    """Admission gate used by render endpoints; a no-op when admission is disabled."""
+    if admission is None:
+        yield 0.0
+        return
+    async with admission.admit(client_key(request), priority, cost) as waited:
+        yield waited
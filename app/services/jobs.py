@@ -0,0 +1,350 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import and_, delete, or_, select, update
+
+from app import models
+from app.config import settings
+from app.services.admission import BULK, INTERACTIVE
+
+# Kolejka zleceń renderowania między podami API (APP_ROLE=api) a workerami
+# (`python -m app.worker`). Dwa backendy o tym samym interfejsie:
+#   DbJobQueue – tabela render_jobs w istniejącej bazie (SKIP LOCKED + lease),
+#   FsJobQueue – katalog na wspólnym dysku (atomowy rename + lease po mtime).
+# Worker odnawia lease w trakcie renderowania; complete/fail/renew działają tylko dla
+# bieżącego właściciela i zwracają False, gdy zlecenie przejął inny worker.
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# Workery pobierają zlecenia wg (priorytet, kolejność) – payload["priority"] to klasa z admission control,
+# więc pojedyncze etykiety nie czekają za masowymi partiami.
+PRIORITY_RANK = {INTERACTIVE: 0, BULK: 1}
+
+
+def _rank(payload: dict) -> int:
+    return PRIORITY_RANK.get(payload.get("priority"), PRIORITY_RANK[BULK])
+
+
+@dataclass
+class JobResult:
+    status: str
+    content: Optional[bytes] = None
+    media_type: Optional[str] = None
+    filename: Optional[str] = None
+    warnings: list[str] = field(default_factory=list)
+    error: Optional[str] = None
+    options: dict = field(default_factory=dict)  # RenderOptions zlecenia (np. svg_encoding dla /jobs/{id})
+
+
+@dataclass
+class ClaimedJob:
+    id: str
+    payload: dict
+    attempts: int
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class DbJobQueue:
+    def __init__(self, session_factory, lease_s: float, max_attempts: int, retention_s: float):
+        self.session_factory = session_factory
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self.retention_s = retention_s
+
+    async def enqueue(self, payload: dict) -> str:
+        job_id = str(uuid.uuid4())
+        async with self.session_factory() as session:
+            session.add(models.RenderJob(id=job_id, status=QUEUED, priority=_rank(payload),
+                                         payload=payload, attempts=0))
+            await session.commit()
+        return job_id
+
+    async def status(self, job_id: str) -> Optional[str]:
+        async with self.session_factory() as session:
+            return await session.scalar(select(models.RenderJob.status).where(models.RenderJob.id == job_id))
+
+    async def result(self, job_id: str) -> Optional[JobResult]:
+        async with self.session_factory() as session:
+            job = await session.get(models.RenderJob, job_id)
+            if not job:
+                return None
+            return JobResult(job.status, job.result, job.media_type, job.filename, job.warnings or [], job.error,
+                             job.payload.get("options") or {})
+
+    async def claim(self, worker_id: str) -> Optional[ClaimedJob]:
+        J = models.RenderJob
+        now = _now()
+        async with self.session_factory() as session:
+            row = (await session.execute(
+                select(J.id, J.status, J.lease_until)
+                .where(or_(J.status == QUEUED, and_(J.status == RUNNING, J.lease_until < now)))
+                .order_by(J.priority, J.created_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )).first()
+            if not row:
+                return None
+            # warunkowy UPDATE – na bazach bez SKIP LOCKED (SQLite) wygrywa tylko jeden worker
+            lease_cond = J.lease_until.is_(None) if row.lease_until is None else J.lease_until == row.lease_until
+            res = await session.execute(
+                update(J)
+                .where(J.id == row.id, J.status == row.status, lease_cond)
+                .values(status=RUNNING, worker=worker_id, attempts=J.attempts + 1,
+                        lease_until=now + timedelta(seconds=self.lease_s))
+            )
+            await session.commit()
+            if res.rowcount != 1:
+                return None
+            job = await session.get(J, row.id)
+            return ClaimedJob(job.id, job.payload, job.attempts)
+
+    async def _update_owned(self, job_id: str, worker_id: str, **values) -> bool:
+        # tylko bieżący właściciel lease – po przejęciu zlecenia stary worker niczego nie nadpisze
+        J = models.RenderJob
+        async with self.session_factory() as session:
+            res = await session.execute(
+                update(J).where(J.id == job_id, J.worker == worker_id, J.status == RUNNING).values(**values)
+            )
+            await session.commit()
+            return res.rowcount == 1
+
+    async def renew(self, job_id: str, worker_id: str) -> bool:
+        return await self._update_owned(job_id, worker_id, lease_until=_now() + timedelta(seconds=self.lease_s))
+
+    async def complete(self, job_id: str, worker_id: str,
+                       exported: Optional[tuple[bytes, str, str]], warnings: list[str]) -> bool:
+        content, media_type, filename = exported or (None, None, None)
+        return await self._update_owned(
+            job_id, worker_id, status=DONE, result=content, media_type=media_type, filename=filename,
+            warnings=warnings, finished_at=_now(), lease_until=None)
+
+    async def fail(self, job_id: str, worker_id: str, error: str, attempts: int) -> bool:
+        retry = attempts < self.max_attempts
+        return await self._update_owned(
+            job_id, worker_id, status=QUEUED if retry else FAILED, error=error[:2000], lease_until=None,
+            finished_at=None if retry else _now())
+
+    async def purge(self):
+        J = models.RenderJob
+        cutoff = _now() - timedelta(seconds=self.retention_s)
+        async with self.session_factory() as session:
+            await session.execute(delete(J).where(J.status.in_((DONE, FAILED)), J.finished_at < cutoff))
+            await session.commit()
+
+
+class FsJobQueue:
+    """Queue in a shared directory: one subdirectory per state, claim = atomic rename.
+
+    Job ids start with the priority rank (``0-…``/``1-…``), so the claim order
+    is (rank, mtime) and survives lease expiry and retries.
+    """
+
+    def __init__(self, base_dir: str, lease_s: float, max_attempts: int, retention_s: float):
+        self.base = Path(base_dir)
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self.retention_s = retention_s
+        for state in (QUEUED, RUNNING, DONE, FAILED):
+            (self.base / state).mkdir(parents=True, exist_ok=True)
+
+    def _path(self, state: str, job_id: str, suffix: str = ".json") -> Path:
+        return self.base / state / f"{job_id}{suffix}"
+
+    @staticmethod
+    def _write(path: Path, data: bytes):
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    # -- sync --
+
+    def _enqueue(self, payload: dict) -> str:
+        job_id = f"{_rank(payload)}-{uuid.uuid4()}"
+        self._write(self._path(QUEUED, job_id), json.dumps({"payload": payload, "attempts": 0}).encode())
+        return job_id
+
+    def _status(self, job_id: str) -> Optional[str]:
+        for state in (DONE, FAILED, RUNNING, QUEUED):
+            if self._path(state, job_id).exists():
+                return state
+        # kończone właśnie przez workera (plik przeniesiony przez _take)
+        if any((self.base / RUNNING).glob(f"{job_id}.json.*.closing")):
+            return RUNNING
+        return None
+
+    def _result(self, job_id: str) -> Optional[JobResult]:
+        state = self._status(job_id)
+        if state in (DONE, FAILED):
+            meta = json.loads(self._path(state, job_id).read_bytes())
+            blob = self._path(DONE, job_id, ".bin")
+            content = blob.read_bytes() if state == DONE and blob.exists() else None
+            return JobResult(state, content, meta.get("media_type"), meta.get("filename"),
+                             meta.get("warnings") or [], meta.get("error"), meta.get("options") or {})
+        return JobResult(state) if state else None
+
+    def _reap_expired(self):
+        cutoff = time.time() - self.lease_s
+        for p in (self.base / RUNNING).glob("*.json"):
+            try:
+                if p.stat().st_mtime < cutoff:
+                    os.rename(p, self.base / QUEUED / p.name)
+            except FileNotFoundError:
+                pass
+
+    def _claim(self, worker_id: str) -> Optional[ClaimedJob]:
+        self._reap_expired()
+        queued = []
+        for p in (self.base / QUEUED).glob("*.json"):
+            try:
+                queued.append((p.name[:1], p.stat().st_mtime, p))
+            except FileNotFoundError:
+                pass
+        for _, _, p in sorted(queued):
+            target = self.base / RUNNING / p.name
+            try:
+                # rename zachowuje mtime – bez odświeżenia zlecenie czekające dłużej niż lease
+                # od razu wyglądałoby na wygasłe i inny worker oddałby je do kolejki
+                os.utime(p)
+                os.rename(p, target)
+                data = json.loads(target.read_bytes())
+            except FileNotFoundError:
+                continue  # inny worker był szybszy
+            data["attempts"] += 1
+            data["worker"] = worker_id
+            self._write(target, json.dumps(data).encode())  # odświeża też mtime = początek lease
+            return ClaimedJob(p.stem, data["payload"], data["attempts"])
+        return None
+
+    def _renew(self, job_id: str, worker_id: str) -> bool:
+        running = self._path(RUNNING, job_id)
+        try:
+            if json.loads(running.read_bytes()).get("worker") != worker_id:
+                return False
+            os.utime(running)  # mtime = początek lease
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _take(self, job_id: str, worker_id: str) -> Optional[tuple[Path, dict]]:
+        """Atomically take the running file away from the reaper, if ``worker_id`` still owns it.
+
+        None means the lease was lost: the job was reclaimed (and maybe finished) by another worker.
+        """
+        running = self._path(RUNNING, job_id)
+        closing = running.with_name(f"{running.name}.{uuid.uuid4().hex}.closing")
+        try:
+            os.rename(running, closing)
+        except FileNotFoundError:
+            return None
+        data = json.loads(closing.read_bytes())
+        if data.get("worker") != worker_id:
+            os.rename(closing, running)
+            return None
+        return closing, data
+
+    def _complete(self, job_id: str, worker_id: str,
+                  exported: Optional[tuple[bytes, str, str]], warnings: list[str]) -> bool:
+        taken = self._take(job_id, worker_id)
+        if taken is None:
+            return False
+        content, media_type, filename = exported or (None, None, None)
+        if content is not None:
+            self._write(self._path(DONE, job_id, ".bin"), content)
+        meta = {"media_type": media_type, "filename": filename, "warnings": warnings,
+                "options": taken[1]["payload"].get("options") or {}}
+        self._write(self._path(DONE, job_id), json.dumps(meta).encode())
+        taken[0].unlink(missing_ok=True)
+        return True
+
+    def _fail(self, job_id: str, worker_id: str, error: str, attempts: int) -> bool:
+        taken = self._take(job_id, worker_id)
+        if taken is None:
+            return False
+        closing, data = taken
+        if attempts < self.max_attempts:
+            data["error"] = error[:2000]
+            data.pop("worker", None)
+            self._write(self._path(QUEUED, job_id), json.dumps(data).encode())
+        else:
+            self._write(self._path(FAILED, job_id), json.dumps({"error": error[:2000]}).encode())
+        closing.unlink(missing_ok=True)
+        return True
+
+    def _purge(self):
+        cutoff = time.time() - self.retention_s
+        for state in (DONE, FAILED):
+            for p in (self.base / state).iterdir():
+                try:
+                    if p.stat().st_mtime < cutoff:
+                        p.unlink()
+                except FileNotFoundError:
+                    pass
+
+    # -- async API (jak DbJobQueue) --
+
+    async def enqueue(self, payload: dict) -> str:
+        return await asyncio.to_thread(self._enqueue, payload)
+
+    async def status(self, job_id: str) -> Optional[str]:
+        return await asyncio.to_thread(self._status, job_id)
+
+    async def result(self, job_id: str) -> Optional[JobResult]:
+        return await asyncio.to_thread(self._result, job_id)
+
+    async def claim(self, worker_id: str) -> Optional[ClaimedJob]:
+        return await asyncio.to_thread(self._claim, worker_id)
+
+    async def renew(self, job_id: str, worker_id: str) -> bool:
+        return await asyncio.to_thread(self._renew, job_id, worker_id)
+
+    async def complete(self, job_id: str, worker_id: str,
+                       exported: Optional[tuple[bytes, str, str]], warnings: list[str]) -> bool:
+        return await asyncio.to_thread(self._complete, job_id, worker_id, exported, warnings)
+
+    async def fail(self, job_id: str, worker_id: str, error: str, attempts: int) -> bool:
+        return await asyncio.to_thread(self._fail, job_id, worker_id, error, attempts)
+
+    async def purge(self):
+        await asyncio.to_thread(self._purge)
+
+
+_queue = None
+
+
+def get_job_queue():
+    """Process-wide queue backend selected by ``JOB_QUEUE``."""
+    global _queue
+    if _queue is None:
+        opts = dict(lease_s=settings.JOB_LEASE_S, max_attempts=settings.JOB_MAX_ATTEMPTS,
+                    retention_s=settings.JOB_RETENTION_S)
+        if settings.JOB_QUEUE == "fs":
+            _queue = FsJobQueue(settings.JOB_QUEUE_DIR, **opts)
+        else:
+            from app.db import SessionLocal
+            _queue = DbJobQueue(SessionLocal, **opts)
+    return _queue
+
+
+async def wait_for_job(job_id: str, timeout_s: float) -> Optional[JobResult]:
+    """Poll until the job is done/failed; None on timeout."""
+    queue = get_job_queue()
+    deadline = time.monotonic() + timeout_s
+    delay = 0.05
+    while True:
+        state = await queue.status(job_id)
+        if state in (DONE, FAILED):
+            return await queue.result(job_id)
+        if time.monotonic() >= deadline:
+            return None
+        await asyncio.sleep(delay)
+        delay = min(delay * 1.5, 0.5)
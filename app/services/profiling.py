@@ -0,0 +1,125 @@
+import cProfile
+import io
+import json
+import pstats
+import secrets
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Request
+
+from app.config import settings
+
+# Profilowanie pojedynczych zleceń (?profile=1). Etapy renderowania otaczamy `stage(name)`;
+# bez aktywnego profilu to jeden odczyt ContextVar i współdzielony nullcontext.
+
+_current: ContextVar[Optional["RenderProfile"]] = ContextVar("render_profile", default=None)
+_NULL = nullcontext()
+
+
+class RenderProfile:
+    """Exclusive wall time per stage: a nested stage is not counted in its parent."""
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self._stack: list[float] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            yield
+        finally:
+            dt = time.perf_counter() - t0
+            child = self._stack.pop()
+            self.stages[name] = self.stages.get(name, 0.0) + dt - child
+            self.counts[name] = self.counts.get(name, 0) + 1
+            if self._stack:
+                self._stack[-1] += dt
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={sec * 1000:.2f}" for name, sec in self.stages.items())
+
+
+def stage(name: str):
+    prof = _current.get()
+    return prof.stage(name) if prof is not None else _NULL
+
+
+def is_profiling() -> bool:
+    return _current.get() is not None
+
+
+def run_profiled(fn: Callable, *args, **kwargs):
+    """Run ``fn`` under cProfile and stage timing in the calling thread."""
+    prof = RenderProfile()
+    token = _current.set(prof)
+    pr = cProfile.Profile()
+    t0 = time.perf_counter()
+    pr.enable()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        pr.disable()
+        prof.stages["total"] = time.perf_counter() - t0
+        _current.reset(token)
+    return result, prof, pr
+
+
+# ---- zrzuty profili ----
+
+def _profile_dir() -> Path:
+    path = Path(settings.PROFILE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def save_profile(prof: RenderProfile, pr: cProfile.Profile, endpoint: str) -> str:
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    base = _profile_dir()
+    pr.dump_stats(str(base / f"{profile_id}.prof"))
+    meta = {
+        "id": profile_id,
+        "endpoint": endpoint,
+        "stages_ms": {k: round(v * 1000, 3) for k, v in prof.stages.items()},
+        "counts": prof.counts,
+    }
+    (base / f"{profile_id}.json").write_text(json.dumps(meta), encoding="utf-8")
+    # trzymamy tylko PROFILE_KEEP najnowszych (0 = żadnego; [:-0] dałoby pustą listę)
+    dumps = sorted(base.glob("*.json"))
+    keep = max(settings.PROFILE_KEEP, 0)
+    for old in dumps[:len(dumps) - keep]:
+        old.unlink(missing_ok=True)
+        old.with_suffix(".prof").unlink(missing_ok=True)
+    return profile_id
+
+
+def list_profiles() -> list[dict]:
+    base = _profile_dir()
+    return [json.loads(p.read_text(encoding="utf-8")) for p in sorted(base.glob("*.json"), reverse=True)]
+
+
+def profile_path(profile_id: str) -> Optional[Path]:
+    path = _profile_dir() / f"{Path(profile_id).name}.prof"
+    return path if path.exists() else None
+
+
+def profile_text(path: Path, sort: str = "cumulative", limit: int = 60) -> str:
+    out = io.StringIO()
+    pstats.Stats(str(path), stream=out).sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+def require_debug(request: Request):
+    """Gate for profiling: DEBUG_TOKEN must be set and sent as ``X-Debug-Token``."""
+    if not settings.DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Not found")
+    sent = request.headers.get("x-debug-token", "")
+    if not secrets.compare_digest(sent.encode(), settings.DEBUG_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
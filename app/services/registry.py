@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from typing import Callable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.schemas import SheetDef, TypeDef
+
+log = logging.getLogger(__name__)
+
+TYPE = "type"
+SHEET = "sheet"
+
+Listener = Callable[[str, str], None]
+
+
+class Registry:
+    """In-memory view of label types and sheets used on the render path.
+
+    Built-ins are seeded from code; rows from the database add to or override
+    them. The DB is only read by :meth:`refresh`, which fetches rows newer than
+    the last seen version counter, so lookups never hit the database.
+    Dicts are replaced copy-on-write, so readers in worker threads always see
+    a consistent snapshot. Listeners get ``(kind, key)`` for every changed
+    entry and use it to drop their caches.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._builtin: dict[str, dict] = {TYPE: {}, SHEET: {}}
+        self._current: dict[str, dict] = {TYPE: {}, SHEET: {}}
+        self._listeners: list[Listener] = []
+        self._lock = asyncio.Lock()
+
+    def seed(self, kind: str, defs: dict):
+        self._builtin[kind] = dict(defs)
+        self._current[kind] = {**defs, **self._current[kind]}
+
+    def subscribe(self, listener: Listener):
+        self._listeners.append(listener)
+
+    def is_builtin(self, kind: str, key: str) -> bool:
+        return key in self._builtin[kind]
+
+    def template(self, key: str) -> Optional[TypeDef]:
+        return self._current[TYPE].get(key)
+
+    def sheet(self, key: str) -> Optional[SheetDef]:
+        return self._current[SHEET].get(key)
+
+    def templates(self) -> list[TypeDef]:
+        return list(self._current[TYPE].values())
+
+    def sheets(self) -> list[SheetDef]:
+        return list(self._current[SHEET].values())
+
+    async def refresh(self, session: AsyncSession) -> bool:
+        """Apply DB changes newer than ``self.version``; returns True if anything changed."""
+        async with self._lock:
+            head = await session.scalar(select(models.RegistryVersion.version).where(models.RegistryVersion.id == 1))
+            if head is None or head <= self.version:
+                return False
+            changed: list[tuple[str, str]] = []
+            for kind, model, schema in ((TYPE, models.LabelTemplate, TypeDef), (SHEET, models.LabelSheet, SheetDef)):
+                res = await session.execute(
+                    select(model).where(model.version > self.version, model.version <= head)
+                )
+                rows = list(res.scalars())
+                if not rows:
+                    continue
+                current = dict(self._current[kind])
+                for row in rows:
+                    if row.deleted:
+                        builtin = self._builtin[kind].get(row.key)
+                        if builtin is not None:
+                            current[row.key] = builtin
+                        else:
+                            current.pop(row.key, None)
+                    else:
+                        current[row.key] = schema.model_validate(row, from_attributes=True)
+                    changed.append((kind, row.key))
+                self._current[kind] = current
+            self.version = head
+
+        for kind, key in changed:
+            for listener in self._listeners:
+                listener(kind, key)
+        if changed:
+            log.info("registry refreshed to v%s (%d changes)", head, len(changed))
+        return bool(changed)
+
+
+registry = Registry()
+
+
+async def refresh_loop(session_factory, interval_s: float):
+    """Poll the version counter so changes made by other replicas show up."""
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            async with session_factory() as session:
+                await registry.refresh(session)
+        except Exception:
+            log.exception("registry refresh failed")
@@ -1,4 +1,9 @@
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud import create_sheet_db, delete_sheet_db, update_sheet_db
 from app.schemas import SheetDef
+from app.services.registry import SHEET, registry
 
 SHEETS: dict[str, SheetDef] = {
     # A4 swobodne (user grid w mm)
@@ -19,6 +24,35 @@ SHEETS: dict[str, SheetDef] = {
         margin_top_mm=12.7, margin_left_mm=5.0, gutter_x_mm=2.5, gutter_y_mm=0.0
     ),
 }
+registry.seed(SHEET, SHEETS)
 
 def get_sheet_by_key(key: str) -> SheetDef | None:
-    return SHEETS.get(key)
\ No newline at end of file
+    return registry.sheet(key)
+
+def list_sheets() -> list[SheetDef]:
+    return registry.sheets()
+
+async def create_sheet(session: AsyncSession, data: SheetDef) -> SheetDef:
+    try:
+        await create_sheet_db(session, data)
+    except ValueError:
+        raise HTTPException(status_code=409, detail=f"Sheet already exists: {data.key}")
+    await registry.refresh(session)
+    return registry.sheet(data.key)
+
+async def update_sheet(session: AsyncSession, key: str, data: SheetDef) -> SheetDef:
+    if data.key != key:
+        raise HTTPException(status_code=400, detail="Key in path and body must match")
+    try:
+        await update_sheet_db(session, data)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"Custom sheet not found: {key}")
+    await registry.refresh(session)
+    return registry.sheet(key)
+
+async def delete_sheet(session: AsyncSession, key: str):
+    try:
+        await delete_sheet_db(session, key)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"Custom sheet not found: {key}")
+    await registry.refresh(session)
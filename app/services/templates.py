@@ -1,6 +1,11 @@
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud import create_template_db, delete_template_db, update_template_db
 from app.schemas import TypeDef
+from app.services.registry import TYPE, registry
 
-# Predefiniowane typy (MVP – łatwo dodać kolejne)
+# Predefiniowane typy (MVP – łatwo dodać kolejne); wpisy z bazy mogą je nadpisać
 TEMPLATES: dict[str, TypeDef] = {
     "jar_label_small": TypeDef(key="jar_label_small", name="Słoik – mała (58×30)", width_mm=58.0, height_mm=30.0, shape="oval"),
     "jar_label_medium": TypeDef(key="jar_label_medium", name="Słoik – średnia (70×35)", width_mm=70.0, height_mm=35.0, shape="rect"),
@@ -8,6 +13,35 @@ TEMPLATES: dict[str, TypeDef] = {
     "parcel_medium": TypeDef(key="parcel_medium", name="Przesyłka – 99×67", width_mm=99.0, height_mm=67.0, shape="rect"),
     "round_50": TypeDef(key="round_50", name="Okrągła Ø50", width_mm=50.0, height_mm=50.0, shape="round"),
 }
+registry.seed(TYPE, TEMPLATES)
 
 def get_template_by_key(key: str) -> TypeDef | None:
-    return TEMPLATES.get(key)
+    return registry.template(key)
+
+def list_templates() -> list[TypeDef]:
+    return registry.templates()
+
+async def create_template(session: AsyncSession, data: TypeDef) -> TypeDef:
+    try:
+        await create_template_db(session, data)
+    except ValueError:
+        raise HTTPException(status_code=409, detail=f"Type already exists: {data.key}")
+    await registry.refresh(session)
+    return registry.template(data.key)
+
+async def update_template(session: AsyncSession, key: str, data: TypeDef) -> TypeDef:
+    if data.key != key:
+        raise HTTPException(status_code=400, detail="Key in path and body must match")
+    try:
+        await update_template_db(session, data)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"Custom type not found: {key}")
+    await registry.refresh(session)
+    return registry.template(key)
+
+async def delete_template(session: AsyncSession, key: str):
+    try:
+        await delete_template_db(session, key)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"Custom type not found: {key}")
+    await registry.refresh(session)
@@ -0,0 +1,78 @@
+"""Render worker: claims jobs queued by API pods (APP_ROLE=api) and renders them.
+
+    python -m app.worker
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from app.config import settings
+from app.db import init_db
+from app.render.pipeline import run_render_job
+from app.services.icons import IconResolver
+from app.services.jobs import get_job_queue
+
+log = logging.getLogger("app.worker")
+
+PURGE_EVERY_S = 300.0
+
+
+async def run_worker():
+    if settings.JOB_QUEUE != "fs":
+        await init_db()
+    queue = get_job_queue()
+    icon_resolver = IconResolver(base_dir="assets/tabler-icons")
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    log.info("render worker %s started (queue=%s)", worker_id, settings.JOB_QUEUE)
+
+    next_purge = 0.0
+    while True:
+        if time.monotonic() >= next_purge:
+            await queue.purge()
+            next_purge = time.monotonic() + PURGE_EVERY_S
+
+        job = await queue.claim(worker_id)
+        if job is None:
+            await asyncio.sleep(settings.WORKER_POLL_S)
+            continue
+        if job.attempts > settings.JOB_MAX_ATTEMPTS:
+            await queue.fail(job.id, worker_id, "max_attempts_exceeded", job.attempts)
+            continue
+
+        t0 = time.perf_counter()
+        try:
+            exported, warnings = await _render_with_lease(queue, job, worker_id, icon_resolver)
+        except Exception as e:
+            log.exception("job %s failed (attempt %d)", job.id, job.attempts)
+            if not await queue.fail(job.id, worker_id, f"{type(e).__name__}: {e}", job.attempts):
+                log.warning("job %s: lease lost, failure not recorded", job.id)
+            continue
+        if await queue.complete(job.id, worker_id, exported, warnings):
+            log.info("job %s done in %.1f ms", job.id, (time.perf_counter() - t0) * 1000)
+        else:
+            log.warning("job %s: lease lost, result dropped", job.id)
+
+
+async def _render_with_lease(queue, job, worker_id: str, icon_resolver: IconResolver):
+    """Render in a thread, renewing the job lease every third of ``JOB_LEASE_S`` until done."""
+    render = asyncio.ensure_future(asyncio.to_thread(run_render_job, job.payload, icon_resolver))
+    owned = True
+    while True:
+        done, _ = await asyncio.wait({render}, timeout=settings.JOB_LEASE_S / 3)
+        if done:
+            return render.result()
+        if owned and not await queue.renew(job.id, worker_id):
+            # wątku nie przerwiemy – dokończymy, a complete() i tak niczego nie nadpisze
+            owned = False
+            log.warning("job %s: lease lost while rendering", job.id)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(run_worker())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Micro-benchmarks for the render path.
+
+Run from the repo root:
+
+    python -m scripts.bench_render text [--n 2000]
+    python -m scripts.bench_render export [--n 100]
+"""
+import argparse
+import gzip
+import random
+import time
+
+from app.render.compression import brotli
+from app.render.layout import export_svg_pages, layout_labels_to_pages
+from app.render.svg_renderer import render_label_svg
+from app.render.text_metrics import get_metrics
+from app.schemas import LabelItem, RenderOptions
+from app.services.icons import IconResolver
+from app.services.sheets import SHEETS
+from app.services.templates import TEMPLATES
+
+_WORDS = ("Powidła", "śliwkowe", "Dżem", "truskawkowy", "bez", "cukru", "Ogórki", "kiszone",
+          "z", "czosnkiem", "i", "koperkiem", "Sos", "pomidorowy", "2025", "VIII", "domowy")
+
+
+def _items(n: int, seed: int = 1) -> list[LabelItem]:
+    rnd = random.Random(seed)
+    return [
+        LabelItem(
+            title=" ".join(rnd.choice(_WORDS) for _ in range(rnd.randint(1, 7))),
+            text=" ".join(rnd.choice(_WORDS) for _ in range(rnd.randint(0, 6))) or None,
+        )
+        for _ in range(n)
+    ]
+
+
+def bench_text(n: int):
+    items = _items(n)
+    resolver = IconResolver(base_dir="assets/tabler-icons")
+    colors = {"bg": "#fff", "color": "#111827", "border": "#111827"}
+    get_metrics(True), get_metrics(False)  # ładowanie tabel poza pomiarem
+
+    print(f"text fit: {n} labels, metrics={get_metrics(False).name}")
+    for tpl_key in ("jar_label_small", "parcel_medium"):
+        tpl = TEMPLATES[tpl_key]
+        for mode in ("off", "shrink", "wrap"):
+            get_metrics(True).em_width.cache_clear()
+            get_metrics(False).em_width.cache_clear()
+            overflow = 0
+            t0 = time.perf_counter()
+            for item in items:
+                _, _, _, warns = render_label_svg(item, tpl, resolver, colors, text_fit=mode)
+                overflow += sum(w.startswith("text_overflow") for w in warns)
+            dt = time.perf_counter() - t0
+            print(f"  {tpl_key:16} {mode:7} {n / dt:10.0f} labels/s  overflow={overflow}")
+
+
+def _timed(fn, repeat: int = 3):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return out, best * 1000
+
+
+def bench_export(n: int):
+    resolver = IconResolver(base_dir="assets/tabler-icons")
+    colors = {"bg": "#fff", "color": "#111827", "border": "#111827"}
+    tpl = TEMPLATES["jar_label_small"]
+    opts = RenderOptions()  # etykiety jak z API (domyślne text_fit/max_lines)
+    label_svgs = [render_label_svg(it, tpl, resolver, colors, text_fit=opts.text_fit, max_lines=opts.max_lines)[:3]
+                  for it in _items(n)]
+    pages = layout_labels_to_pages(label_svgs, SHEETS["A4"], with_cut_marks=True)
+    raw = sum(len(p["svg"].encode("utf-8")) for p in pages)
+    print(f"export: {n} labels, {len(pages)} pages, raw SVG {raw} B")
+
+    def row(name, fn):
+        out, ms = _timed(fn)
+        size = len(out[0]) if isinstance(out, tuple) else len(out)
+        print(f"  {name:28} {ms:9.1f} ms {size:10d} B")
+
+    for level in (0, 1, 6, 9):
+        row(f"zip svg level={level}", lambda: export_svg_pages(pages, "zip", zip_level=level))
+    svg = pages[0]["svg"].encode("utf-8")
+    for level in (1, 6, 9):
+        row(f"svg page gzip={level}", lambda: gzip.compress(svg, compresslevel=level, mtime=0))
+        if brotli is not None:
+            row(f"svg page br={level}", lambda: brotli.compress(svg, quality=level))
+
+    try:
+        import cairosvg  # noqa: F401 – OSError, gdy brak libcairo
+    except (ImportError, OSError) as e:
+        print(f"  (pdf/png skipped: {e.__class__.__name__})")
+        return
+    for level in (0, 6):
+        row(f"pdf zip level={level}", lambda: export_svg_pages(pages, "pdf", zip_level=level))
+    for dpi in (300, 600):
+        row(f"png rgba dpi={dpi}", lambda: export_svg_pages(pages[:1], "png", dpi=dpi))
+        for mode in ("rgb", "gray", "mono"):
+            for level in (1, 6, 9):
+                row(f"png {mode} level={level} dpi={dpi}",
+                    lambda: export_svg_pages(pages[:1], "png", dpi=dpi, png_mode=mode, png_level=level))
+    row("png zip level=6 (2 pages)", lambda: export_svg_pages(pages[:2], "png", zip_level=6))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("what", choices=["text", "export"])
+    ap.add_argument("--n", type=int)
+    args = ap.parse_args()
+    if args.what == "text":
+        bench_text(args.n or 2000)
+    else:
+        bench_export(args.n or 100)
+
+
+if __name__ == "__main__":
+    main()
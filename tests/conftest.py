@@ -0,0 +1,32 @@
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import models
+from app.db import Base
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Async context manager yielding a session factory for a fresh SQLite database.
+
+    Tests run their coroutines with ``asyncio.run``, so the engine has to be
+    created and disposed inside that loop.
+    """
+
+    @asynccontextmanager
+    async def open_db():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+        async with factory() as session:
+            session.add(models.RegistryVersion(id=1, version=0))
+            await session.commit()
+        try:
+            yield factory
+        finally:
+            await engine.dispose()
+
+    return open_db
@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.admission import (BULK, INTERACTIVE, AdmissionController,
+                                    batch_priority)
+
+
+def _controller(max_concurrency=1, reserved=0, client_concurrency=100, wait_s=5.0):
+    return AdmissionController(
+        max_concurrency=max_concurrency,
+        weights={INTERACTIVE: 4, BULK: 1},
+        client_concurrency=client_concurrency,
+        client_cost_budget=1e9,
+        max_queue_cost=1e9,
+        max_queue_wait_s=wait_s,
+        interactive_reserved=reserved,
+    )
+
+
+async def _hold(ac, client, priority, started: list, release: asyncio.Event):
+    async with ac.admit(client, priority, 1.0):
+        started.append(client)
+        await release.wait()
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_stride_hands_out_slots_by_weight():
+    async def run():
+        ac = _controller()
+        order: list[str] = []
+
+        async def job(name, priority):
+            async with ac.admit(name, priority, 1.0):
+                order.append(name)
+
+        release = asyncio.Event()
+        blocker = asyncio.create_task(_hold(ac, "blocker", BULK, [], release))
+        await _settle()
+        tasks = [asyncio.create_task(job(f"b{i}", BULK)) for i in range(5)]
+        tasks += [asyncio.create_task(job(f"i{i}", INTERACTIVE)) for i in range(5)]
+        await _settle()
+        assert ac.metrics()["queued"] == {INTERACTIVE: 5, BULK: 5}
+        release.set()
+        await asyncio.gather(blocker, *tasks)
+        return order
+
+    order = asyncio.run(run())
+    # waga 4:1 – w pierwszych pięciu przydziałach cztery interaktywne, FIFO w obrębie klasy
+    assert [n[0] for n in order[:5]].count("i") == 4
+    assert [n for n in order if n[0] == "i"] == [f"i{i}" for i in range(5)]
+    assert [n for n in order if n[0] == "b"] == [f"b{i}" for i in range(5)]
+
+
+def test_bulk_never_takes_reserved_interactive_slot():
+    async def run():
+        ac = _controller(max_concurrency=2, reserved=1)
+        started: list[str] = []
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(_hold(ac, "b1", BULK, started, release)),
+                 asyncio.create_task(_hold(ac, "b2", BULK, started, release))]
+        await _settle()
+        assert started == ["b1"]  # b2 czeka, choć slot jest wolny
+        tasks.append(asyncio.create_task(_hold(ac, "i1", INTERACTIVE, started, release)))
+        await _settle()
+        assert started == ["b1", "i1"]
+        assert ac.metrics()["running_by_class"] == {INTERACTIVE: 1, BULK: 1}
+        release.set()
+        await asyncio.gather(*tasks)
+        assert started == ["b1", "i1", "b2"]
+        assert ac.metrics()["running"] == 0
+
+    asyncio.run(run())
+
+
+def test_queue_timeout_returns_503_and_cleans_up():
+    async def run():
+        ac = _controller(wait_s=0.05)
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(ac, "a", BULK, [], release))
+        await _settle()
+        with pytest.raises(HTTPException) as exc:
+            async with ac.admit("b", BULK, 7.0):
+                pass
+        assert exc.value.status_code == 503
+        m = ac.metrics()
+        assert m["queued"] == {INTERACTIVE: 0, BULK: 0}
+        assert m["queued_cost"] == 0
+        assert m["classes"][BULK]["timed_out"] == 1
+        assert "b" not in ac._client_active and "b" not in ac._client_cost
+        release.set()
+        await holder
+        assert ac.metrics()["running"] == 0 and ac.metrics()["active_clients"] == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_is_removed_from_queue():
+    async def run():
+        ac = _controller()
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(ac, "a", BULK, [], release))
+        await _settle()
+        waiter = asyncio.create_task(_hold(ac, "b", INTERACTIVE, [], asyncio.Event()))
+        await _settle()
+        assert ac.metrics()["queued"][INTERACTIVE] == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert ac.metrics()["queued"][INTERACTIVE] == 0
+        assert ac.metrics()["queued_cost"] == 0
+        assert "b" not in ac._client_active
+        release.set()
+        await holder
+        # slot wrócił: kolejne zlecenie wchodzi bez czekania
+        async with ac.admit("c", BULK, 1.0) as waited:
+            assert waited == 0.0
+            assert ac.metrics()["running"] == 1
+        assert ac.metrics()["running"] == 0
+
+    asyncio.run(run())
+
+
+def test_client_concurrency_limit_is_429():
+    async def run():
+        ac = _controller(max_concurrency=4, client_concurrency=1)
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(ac, "a", BULK, [], release))
+        await _settle()
+        with pytest.raises(HTTPException) as exc:
+            async with ac.admit("a", INTERACTIVE, 1.0):
+                pass
+        assert exc.value.status_code == 429
+        async with ac.admit("other", INTERACTIVE, 1.0):
+            pass
+        release.set()
+        await holder
+
+    asyncio.run(run())
+
+
+def test_only_cheap_previews_are_interactive():
+    assert batch_priority(True, 10.0) == INTERACTIVE
+    assert batch_priority(True, 10_000.0) == BULK
+    assert batch_priority(False, 1.0) == BULK
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.services.admission import BULK, INTERACTIVE
+from app.services.jobs import (DONE, FAILED, QUEUED, RUNNING, DbJobQueue,
+                               FsJobQueue)
+
+LEASE_S = 0.2
+
+
+@pytest.fixture(params=["db", "fs"])
+def open_queue(request, db, tmp_path):
+    @asynccontextmanager
+    async def open_():
+        if request.param == "fs":
+            yield FsJobQueue(str(tmp_path / "jobs"), LEASE_S, max_attempts=2, retention_s=3600)
+            return
+        async with db() as factory:
+            yield DbJobQueue(factory, LEASE_S, max_attempts=2, retention_s=3600)
+
+    return open_
+
+
+async def _expire_lease():
+    await asyncio.sleep(LEASE_S * 1.5)
+
+
+def test_claims_interactive_before_bulk_then_fifo(open_queue):
+    async def run():
+        async with open_queue() as q:
+            for name, priority in (("b1", BULK), ("b2", BULK), ("i1", INTERACTIVE), ("i2", INTERACTIVE)):
+                await q.enqueue({"name": name, "priority": priority})
+                await asyncio.sleep(0.01)  # rozróżnialne created_at/mtime
+            claimed = []
+            while (job := await q.claim("w")) is not None:
+                claimed.append(job.payload["name"])
+            return claimed
+
+    assert asyncio.run(run()) == ["i1", "i2", "b1", "b2"]
+
+
+def test_renewed_lease_is_not_reclaimed(open_queue):
+    async def run():
+        async with open_queue() as q:
+            job_id = await q.enqueue({"priority": BULK})
+            assert (await q.claim("A")).id == job_id
+            for _ in range(3):
+                await asyncio.sleep(LEASE_S / 2)
+                assert await q.renew(job_id, "A")
+            assert await q.claim("B") is None
+            assert await q.complete(job_id, "A", (b"ok", "text/plain", "a.txt"), [])
+            result = await q.result(job_id)
+            assert (result.status, result.content) == (DONE, b"ok")
+
+    asyncio.run(run())
+
+
+def test_stale_worker_cannot_touch_reclaimed_job(open_queue):
+    async def run():
+        async with open_queue() as q:
+            job_id = await q.enqueue({"priority": BULK})
+            first = await q.claim("A")
+            await _expire_lease()
+            second = await q.claim("B")
+            assert second.id == job_id and second.attempts == first.attempts + 1
+
+            assert not await q.renew(job_id, "A")
+            assert not await q.fail(job_id, "A", "boom", first.attempts)
+            assert not await q.complete(job_id, "A", (b"A", "text/plain", "a.txt"), [])
+            assert await q.status(job_id) == RUNNING
+
+            assert await q.complete(job_id, "B", (b"B", "text/plain", "b.txt"), ["w"])
+            result = await q.result(job_id)
+            assert (result.status, result.content, result.warnings) == (DONE, b"B", ["w"])
+            # spóźniony worker po zakończeniu zlecenia też niczego nie zmienia
+            assert not await q.fail(job_id, "A", "late", first.attempts)
+            assert (await q.result(job_id)).status == DONE
+
+    asyncio.run(run())
+
+
+def test_fail_retries_until_max_attempts(open_queue):
+    async def run():
+        async with open_queue() as q:
+            job_id = await q.enqueue({"priority": INTERACTIVE})
+            job = await q.claim("A")
+            assert await q.fail(job_id, "A", "first", job.attempts)
+            assert await q.status(job_id) == QUEUED
+            job = await q.claim("A")
+            assert job.attempts == 2
+            assert await q.fail(job_id, "A", "second", job.attempts)
+            result = await q.result(job_id)
+            assert result.status == FAILED and "second" in result.error
+
+    asyncio.run(run())
+
+
+def test_fs_claim_of_long_queued_job_starts_a_fresh_lease(tmp_path, monkeypatch):
+    q = FsJobQueue(str(tmp_path / "jobs"), LEASE_S, max_attempts=2, retention_s=3600)
+    job_id = q._enqueue({"priority": BULK})
+    old = time.time() - 60
+    os.utime(q._path(QUEUED, job_id), (old, old))
+
+    rename = os.rename
+
+    def rename_then_reap(src, dst):
+        rename(src, dst)
+        if os.path.dirname(dst).endswith(RUNNING):
+            q._reap_expired()  # inny worker sprząta wygasłe lease tuż po przeniesieniu
+
+    monkeypatch.setattr("app.services.jobs.os.rename", rename_then_reap)
+    job = q._claim("A")
+    assert job is not None and job.id == job_id
+    assert q._status(job_id) == RUNNING
+    assert not q._path(QUEUED, job_id).exists()
+
+
+def test_fs_lost_running_file_is_a_lost_lease(tmp_path):
+    q = FsJobQueue(str(tmp_path / "jobs"), LEASE_S, max_attempts=2, retention_s=3600)
+    job_id = q._enqueue({"priority": BULK})
+    job = q._claim("A")
+    q._path(RUNNING, job_id).unlink()
+    assert not q._fail(job_id, "A", "boom", job.attempts)
+    assert not q._complete(job_id, "A", (b"x", "text/plain", "x.txt"), [])
+    assert not q._renew(job_id, "A")
+
+
+def test_fs_job_being_finished_reports_running(tmp_path):
+    q = FsJobQueue(str(tmp_path / "jobs"), LEASE_S, max_attempts=2, retention_s=3600)
+    job_id = q._enqueue({"priority": BULK})
+    q._claim("A")
+    closing, _ = q._take(job_id, "A")
+    assert q._status(job_id) == RUNNING
+    os.rename(closing, q._path(RUNNING, job_id))
+    assert q._complete(job_id, "A", None, [])
+    assert q._status(job_id) == DONE
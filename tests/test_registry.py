@@ -0,0 +1,63 @@
+import asyncio
+
+from app import crud
+from app.schemas import TypeDef
+from app.services.registry import SHEET, TYPE, Registry
+
+BUILTIN = TypeDef(key="jar", name="Słoik", width_mm=58, height_mm=30, shape="oval")
+
+
+def _registry(changes: list) -> Registry:
+    reg = Registry()
+    reg.seed(TYPE, {BUILTIN.key: BUILTIN})
+    reg.seed(SHEET, {})
+    reg.subscribe(lambda kind, key: changes.append((kind, key)))
+    return reg
+
+
+def test_deleted_custom_type_can_be_recreated(db):
+    async def run():
+        changes: list = []
+        reg = _registry(changes)
+        custom = TypeDef(key="box", name="Pudełko", width_mm=70, height_mm=40, shape="rect")
+        async with db() as factory:
+            async with factory() as session:
+                await crud.create_template_db(session, custom)
+                assert await reg.refresh(session)
+                assert reg.template("box") == custom
+
+                await crud.delete_template_db(session, "box")
+                assert await reg.refresh(session)
+                assert reg.template("box") is None
+
+                revived = custom.model_copy(update={"name": "Pudełko v2"})
+                await crud.create_template_db(session, revived)
+                assert await reg.refresh(session)
+                assert reg.template("box") == revived
+
+                # replika, która widzi tylko stan końcowy, dostaje wskrzeszony wiersz
+                late = _registry([])
+                await late.refresh(session)
+                assert late.template("box") == revived
+                assert not await reg.refresh(session)  # brak zmian od ostatniego odczytu
+        assert changes == [(TYPE, "box")] * 3
+
+    asyncio.run(run())
+
+
+def test_deleting_override_restores_builtin(db):
+    async def run():
+        reg = _registry([])
+        override = BUILTIN.model_copy(update={"width_mm": 60})
+        async with db() as factory:
+            async with factory() as session:
+                await crud.create_template_db(session, override)
+                await reg.refresh(session)
+                assert reg.template("jar") == override
+
+                await crud.delete_template_db(session, "jar")
+                await reg.refresh(session)
+                assert reg.template("jar") == BUILTIN
+                assert reg.is_builtin(TYPE, "jar")
+
+    asyncio.run(run())